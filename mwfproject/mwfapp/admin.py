@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Stock, Sale, User  # import your custom user
+from .models import Stock, Sale, Order, StockMovement, User  # import your custom user
 from django.contrib.auth.admin import UserAdmin
 
 # unregister the user model if already registered
@@ -20,8 +20,24 @@ class CustomUserAdmin(UserAdmin):
         ("Custom Fields", {"fields": ("role",)}),
     )
 
+# The stock ledger is append-only: browse it, never edit it here
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "stock", "category", "kind", "quantity", "stock_balance", "category_balance")
+    list_filter = ("kind", "category")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Register your models here.
 admin.site.register(Stock)
 admin.site.register(Sale)
+admin.site.register(Order)
+admin.site.register(StockMovement, StockMovementAdmin)
 # Register your custom user
 admin.site.register(User, CustomUserAdmin)
@@ -0,0 +1,299 @@
+"""
+Sales analytics on columnar NumPy arrays.
+
+load() reads every sale into a SalesColumns: one compact NumPy array per
+field with one element per sale, filled from a raw cursor in a single
+pass (no model instances). Products, categories and agents are small
+integer codes into lookup arrays. Every figure is then a vectorised
+operation over whole columns - np.bincount() sums per product, category,
+agent, day or month - so a report over millions of sales takes
+milliseconds once the columns are loaded.
+
+Margins compare a sale's price with the item's current cost price, as
+the cost at the time of the sale is not recorded. A sale's price is the
+price of the whole line (total_price adds transport to it), so revenue
+here excludes transport.
+
+The loaded columns are kept in this process for the current version of
+the sale, stock and user tables (caching.version()), and each report is
+cached under the same version: nothing is reloaded or recomputed until a
+write changes one of them.
+"""
+import threading
+from datetime import date
+
+import numpy as np
+from django.db import connections, router
+from django.db.models import BigIntegerField, Func, IntegerField
+from django.db.models.functions import Cast
+
+from .caching import cached, version
+from .models import Sale, Stock, User
+
+TABLES = ("sale", "stock", "user")
+# Rows fetched from the cursor per chunk
+CHUNK_SIZE = 50_000
+# Products listed in the report, by revenue
+TOP_PRODUCTS = 20
+MOVING_AVERAGES = (7, 30)
+
+SALE_DTYPE = np.dtype([
+    ("day", np.int32),
+    ("stock", np.int64),
+    ("agent", np.int64),
+    ("units", np.int64),
+    ("price", np.int64),
+])
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+class SalesColumns:
+    """
+    Every sale as parallel arrays in date order, plus the lookups their
+    codes index.
+
+    - day: days since 1970-01-01; month: months since 1970-01 (int32)
+    - product, category, agent: codes into `products`, `categories` and
+      `agents` (int32)
+    - units: quantity sold (int32); revenue, cost: UGX (int64)
+    """
+
+    COLUMNS = ("day", "month", "product", "category", "agent", "units", "revenue", "cost")
+
+    def __init__(self, day, month, product, category, agent, units, revenue, cost,
+                 products, categories, agents):
+        self.day = day
+        self.month = month
+        self.product = product
+        self.category = category
+        self.agent = agent
+        self.units = units
+        self.revenue = revenue
+        self.cost = cost
+        self.products = products
+        self.categories = categories
+        self.agents = agents
+
+    def __len__(self):
+        return len(self.day)
+
+    def between(self, first, last):
+        """The sales from day `first` to `last` inclusive, as views (no copy)."""
+        start, stop = np.searchsorted(self.day, [first, last + 1])
+        return SalesColumns(
+            *(getattr(self, name)[start:stop] for name in self.COLUMNS),
+            self.products, self.categories, self.agents,
+        )
+
+
+class EpochDay(Func):
+    """A date as days since 1970-01-01: cheaper to read than date strings."""
+
+    template = "(%(expressions)s - DATE '1970-01-01')"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(julianday(%(expressions)s) - 2440587.5 AS integer)",
+            **extra_context,
+        )
+
+
+def _read_sales(queryset):
+    # The queryset's SQL on a raw cursor, into one structured array
+    connection = connections[router.db_for_read(Sale)]
+    sql, params = queryset.query.sql_with_params()
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            chunks.append(np.array(rows, dtype=SALE_DTYPE))
+    return np.concatenate(chunks) if chunks else np.empty(0, SALE_DTYPE)
+
+
+def positions(ids, values):
+    """
+    (index of each of `values` in the sorted array `ids`, mask of the
+    values that are in it). A row deleted between two reads leaves
+    references to it that np.searchsorted() alone would send to a
+    neighbour.
+    """
+    index = np.searchsorted(ids, values)
+    found = index < len(ids)
+    found[found] = ids[index[found]] == values[found]
+    return index, found
+
+
+def load():
+    """Read every sale, stock item and agent into a SalesColumns."""
+    sales = _read_sales(
+        Sale.objects.order_by().values_list(
+            EpochDay("date"), "stock_item_id", "sales_agent_id", "quantity_sold",
+            Cast("sale_price", BigIntegerField()),
+        )
+    )
+    # Sorting once here makes any date range a slice (SalesColumns.between)
+    sales = sales[np.argsort(sales["day"], kind="stable")]
+    stock = list(Stock.objects.order_by("id").values_list("id", "name", "category", "cost_price"))
+    agents = list(User.objects.order_by("id").values_list("id", "username", "first_name", "last_name"))
+
+    stock_ids = np.array([row[0] for row in stock], dtype=np.int64)
+    categories, product_category = np.unique(
+        np.array([row[2] for row in stock], dtype=object), return_inverse=True
+    )
+    unit_cost = np.array([int(row[3]) for row in stock], dtype=np.int64)
+    agent_ids = np.array([row[0] for row in agents], dtype=np.int64)
+
+    # Ids to dense codes. The three reads are separate statements, so an
+    # item or agent deleted in between (its sales go with it) can still be
+    # referenced by the sales read first: those sales are dropped. One read
+    # transaction would not do, as it takes SQLite's write lock
+    # (transaction_mode IMMEDIATE) and sees no single snapshot on
+    # PostgreSQL's READ COMMITTED.
+    product, known_product = positions(stock_ids, sales["stock"])
+    agent, known_agent = positions(agent_ids, sales["agent"])
+    known = known_product & known_agent
+    sales, product, agent = sales[known], product[known], agent[known]
+    units = sales["units"].astype(np.int32)
+    return SalesColumns(
+        day=sales["day"],
+        month=sales["day"].astype("datetime64[D]").astype("datetime64[M]").astype(np.int32),
+        product=product.astype(np.int32),
+        category=product_category[product].astype(np.int32),
+        agent=agent.astype(np.int32),
+        units=units,
+        revenue=sales["price"],
+        cost=unit_cost[product] * units,
+        products=np.array([row[1] for row in stock], dtype=object),
+        categories=categories,
+        agents=np.array(
+            [f"{first} {last}".strip() or username for _, username, first, last in agents],
+            dtype=object,
+        ),
+    )
+
+
+def columns():
+    """The SalesColumns for the current data, loaded once per data version."""
+    token = version(*TABLES)
+    with _load_lock:
+        if token not in _loaded:
+            # Only the latest version is kept
+            _loaded.clear()
+            _loaded[token] = load()
+        return _loaded[token]
+
+
+def _day_number(day):
+    return int(np.datetime64(day, "D").astype(np.int32))
+
+
+def moving_average(series, window):
+    """Trailing mean over `window` points (fewer at the start), via cumulative sums."""
+    sums = np.concatenate(([0.0], np.cumsum(series, dtype=np.float64)))
+    ends = np.arange(1, len(series) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+
+def _percent(part, whole):
+    # Element-wise part / whole * 100, 0 where whole is 0
+    part = np.asarray(part, dtype=np.float64)
+    whole = np.asarray(whole, dtype=np.float64)
+    return np.divide(part * 100, whole, out=np.zeros_like(part), where=whole != 0)
+
+
+def _breakdown(codes, names, data, limit=None):
+    # Units, revenue, cost and margin per code, largest revenue first
+    size = len(names)
+    count = np.bincount(codes, minlength=size)
+    units = np.bincount(codes, weights=data.units, minlength=size)
+    revenue = np.bincount(codes, weights=data.revenue, minlength=size)
+    cost = np.bincount(codes, weights=data.cost, minlength=size)
+    margin = revenue - cost
+    margin_pct = _percent(margin, revenue)
+    order = np.argsort(-revenue, kind="stable")
+    order = order[count[order] > 0][:limit]
+    return [
+        {
+            "name": names[i],
+            "sales": int(count[i]),
+            "units": int(units[i]),
+            "revenue": int(revenue[i]),
+            "cost": int(cost[i]),
+            "margin": int(margin[i]),
+            "margin_pct": round(float(margin_pct[i]), 1),
+        }
+        for i in order
+    ]
+
+
+def report(data, today, days):
+    """
+    The analytics page's figures for the `days` up to `today` (all sales
+    if days is 0): totals, per product/category/agent breakdowns, the
+    daily revenue with moving averages, and the last twelve months
+    against the twelve before.
+    """
+    last = _day_number(today)
+    first = last - days + 1 if days else (int(data.day[0]) if len(data) else last)
+    window = data.between(first, last)
+
+    revenue = int(window.revenue.sum())
+    cost = int(window.cost.sum())
+
+    # Daily revenue; the averages start from earlier days where there are any
+    history = max(MOVING_AVERAGES) - 1
+    recent = data.between(first - history, last)
+    daily = np.bincount(
+        recent.day - (first - history), weights=recent.revenue, minlength=last - first + 1 + history
+    )
+    averages = {size: moving_average(daily, size)[history:] for size in MOVING_AVERAGES}
+    day_labels = np.arange(first, last + 1).astype("datetime64[D]").astype(str)
+
+    # Revenue per calendar month: this year's twelve against the year before
+    this_month = np.datetime64(today, "M")
+    months = np.arange(this_month - 23, this_month + 1)
+    two_years = data.between(_day_number(months[0]), last)
+    monthly = np.bincount(
+        two_years.month - months[0].astype(np.int32), weights=two_years.revenue, minlength=24
+    )
+    previous, current = monthly[:12], monthly[12:]
+
+    return {
+        "first_day": date.fromordinal(date(1970, 1, 1).toordinal() + first),
+        "totals": {
+            "sales": len(window),
+            "units": int(window.units.sum()),
+            "revenue": revenue,
+            "cost": cost,
+            "margin": revenue - cost,
+            "margin_pct": round(float(_percent(revenue - cost, revenue)), 1),
+        },
+        "products": _breakdown(window.product, data.products, window, limit=TOP_PRODUCTS),
+        "categories": _breakdown(window.category, data.categories, window),
+        "agents": _breakdown(window.agent, data.agents, window),
+        "daily": {
+            "labels": day_labels.tolist(),
+            "revenue": daily[history:].tolist(),
+            **{f"ma{size}": np.round(values).tolist() for size, values in averages.items()},
+        },
+        "year_over_year": {
+            "labels": [str(month) for month in months[12:]],
+            "current": current.tolist(),
+            "previous": previous.tolist(),
+            "growth_pct": np.round(_percent(current - previous, previous), 1).tolist(),
+            "current_total": int(current.sum()),
+            "previous_total": int(previous.sum()),
+            "growth_total_pct": round(float(_percent(current.sum() - previous.sum(), previous.sum())), 1),
+        },
+    }
+
+
+def cached_report(days, today=None):
+    """report() for the current data, cached until the next write."""
+    today = today or date.today()
+    return cached("analytics", TABLES, lambda: report(columns(), today, days), today, days)
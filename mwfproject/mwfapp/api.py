@@ -0,0 +1,422 @@
+"""
+JSON API for the POS tablets and the nightly sync jobs.
+
+    GET  /api/stocks/          stock lookup; ?q= search, ?category= filter
+    POST /api/stocks/          bulk create/update; objects with an "id" update that item
+    GET  /api/stocks/<id>/     one stock item
+    GET  /api/stocks/autocomplete/?q=   in-stock items by name or category prefix
+    GET  /api/stock-levels/    quantity and value per category, now or ?at= a past time
+    GET  /api/sales/           sales, newest first; ?start= and ?end= dates (inclusive)
+    POST /api/sales/           bulk create
+
+Every endpoint but autocomplete takes ?fields=a,b to return only those
+fields, and the lists are cursor-paginated (?cursor=, ?limit=). Writes are validated with
+StockForm and SaleForm, the rules the bulk import and the forms use, and
+are all or nothing: any invalid object rejects the request, with the
+errors keyed by the object's position. Prices are returned as strings.
+
+The API uses the session login (and its CSRF token for writes).
+Responses are Brotli- or gzip-compressed.
+"""
+import hashlib
+import json
+from collections import Counter
+from functools import lru_cache, wraps
+
+from django.db import transaction
+from django.forms import modelform_factory
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .caching import bump, cached
+from .forms import SaleForm, StockForm
+from .middleware import compress_page
+from .models import Sale, SalesDailyRollup, Stock, StockCategoryTotal, StockMovement
+from .pagination import CursorPaginator
+from .search import search_stocks, suggest_stocks
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+MAX_BULK = 1000
+
+# Stock picker: suggestions per lookup, and how long (seconds) a lookup is
+# cached if the stock does not change first
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_TIMEOUT = 60
+AUTOCOMPLETE_FIELDS = ("id", "name", "category", "quantity", "selling_price")
+
+# Field name in the API -> lookup
+STOCK_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "type": "type",
+    "quantity": "quantity",
+    "category": "category",
+    "color": "color",
+    "cost_price": "cost_price",
+    "selling_price": "selling_price",
+    "supplier": "supplier",
+    "date_added": "date_added",
+    "updated_at": "updated_at",
+}
+SALE_FIELDS = {
+    "id": "id",
+    "date": "date",
+    "stock_item": "stock_item_id",
+    "stock_name": "stock_item__name",
+    "quantity_sold": "quantity_sold",
+    "sale_price": "sale_price",
+    "transport": "transport",
+    "total_price": "total_price",
+    "customer_name": "customer_name",
+    "payment_method": "payment_method",
+    "sales_agent": "sales_agent_id",
+    "order": "order_id",
+    "status": "status",
+    "updated_at": "updated_at",
+}
+
+# Fields clients may write; the rest are set here
+STOCK_WRITE_FIELDS = (
+    "name", "type", "quantity", "category", "color",
+    "cost_price", "selling_price", "supplier", "date_added",
+)
+SALE_WRITE_FIELDS = (
+    "stock_item", "quantity_sold", "sale_price", "customer_name", "payment_method", "date",
+)
+
+
+class APIError(Exception):
+    """Ends the request with `status` and `{"errors": errors}`."""
+
+    def __init__(self, status, errors):
+        super().__init__(errors)
+        self.status = status
+        self.errors = errors
+
+
+def api_view(*methods):
+    """Session login, allowed methods, APIError handling and compression."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({"errors": {"auth": ["Log in first."]}}, status=401)
+            if request.method not in methods:
+                response = JsonResponse(
+                    {"errors": {"method": [f"{request.method} is not allowed."]}}, status=405
+                )
+                response["Allow"] = ", ".join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except APIError as exc:
+                return JsonResponse({"errors": exc.errors}, status=exc.status)
+
+        return compress_page(wrapper)
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def _form(model, form, fields):
+    # The shared form restricted to the fields an object carries
+    return modelform_factory(model, form=form, fields=fields)
+
+
+def form_errors(form):
+    return {field: list(errors) for field, errors in form.errors.items()}
+
+
+def selected_fields(request, available):
+    """The ?fields= subset of `available` (all of it if not given)."""
+    names = [name.strip() for name in request.GET.get("fields", "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise APIError(400, {"fields": [f"Unknown field: {name}" for name in unknown]})
+    return {name: available[name] for name in names} if names else available
+
+
+def serialize(obj, fields):
+    # `obj` is a .values() row or a model instance
+    if isinstance(obj, dict):
+        return {name: obj[lookup] for name, lookup in fields.items()}
+    row = {}
+    for name, lookup in fields.items():
+        value = obj
+        for part in lookup.split("__"):
+            value = getattr(value, part)
+        row[name] = value
+    return row
+
+
+def paginate(request, queryset, fields, ordering):
+    """One page of `queryset` as {"results", "next", "previous"}."""
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_LIMIT:
+        raise APIError(400, {"limit": [f"Must be a whole number from 1 to {MAX_LIMIT}."]})
+    # The ordering fields are always read: the cursor is built from them
+    lookups = dict.fromkeys([*fields.values(), *(name.lstrip("-") for name in ordering)])
+    paginator = CursorPaginator(queryset.values(*lookups), ordering, limit)
+    page = paginator.get_page(request.GET.get("cursor"))
+    return {
+        "results": [serialize(row, fields) for row in page],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    }
+
+
+def json_objects(request):
+    """The request body as a list of objects (a single object is a list of one)."""
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        raise APIError(400, {"body": ["The request body must be JSON."]})
+    objects = payload if isinstance(payload, list) else [payload]
+    if not objects or not all(isinstance(obj, dict) for obj in objects):
+        raise APIError(400, {"body": ["Send an object or a list of objects."]})
+    if len(objects) > MAX_BULK:
+        raise APIError(400, {"body": [f"Send at most {MAX_BULK} objects per request."]})
+    return objects
+
+
+def date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise APIError(400, {name: ["Use a YYYY-MM-DD date."]})
+    return parsed
+
+
+def unknown_keys(obj, allowed):
+    return {key: ["Unknown field."] for key in sorted(set(obj) - set(allowed))}
+
+
+# Stock list and bulk create/update
+@api_view("GET", "POST")
+def stocks(request):
+    fields = selected_fields(request, STOCK_FIELDS)
+    if request.method == "POST":
+        return JsonResponse({"results": save_stocks(json_objects(request), fields)})
+
+    queryset = search_stocks(Stock.objects.all(), request.GET.get("q", "").strip())
+    if request.GET.get("category"):
+        queryset = queryset.filter(category=request.GET["category"])
+    return JsonResponse(paginate(request, queryset, fields, ("name", "id")))
+
+
+def save_stocks(objects, fields):
+    """
+    Create or update stock items from `objects`, recording the stock ledger.
+    - New items are inserted with one bulk_create; updates are partial and
+      written with one bulk_update of the fields given.
+    """
+    ids = [obj["id"] for obj in objects if "id" in obj]
+    if not all(isinstance(pk, int) for pk in ids):
+        raise APIError(400, {"id": ["Stock ids are whole numbers."]})
+    errors = {}
+    with transaction.atomic():
+        # Lock the items being updated and take the figures the ledger last saw
+        existing = Stock.objects.select_for_update().in_bulk(ids)
+        seen, changed = set(), {"updated_at"}
+        results, created, updated = [], [], []
+        for index, obj in enumerate(objects):
+            unknown = unknown_keys(obj, ("id", *STOCK_WRITE_FIELDS))
+            if unknown:
+                errors[index] = unknown
+                continue
+            if "id" in obj:
+                stock = existing.get(obj["id"])
+                if stock is None or obj["id"] in seen:
+                    errors[index] = {"id": ["Unknown or repeated stock id."]}
+                    continue
+                seen.add(obj["id"])
+                old = (stock.quantity, stock.selling_price, stock.category)
+                given = tuple(name for name in STOCK_WRITE_FIELDS if name in obj)
+                changed.update(given)
+                form = _form(Stock, StockForm, given)(data=obj, instance=stock)
+            else:
+                old = None
+                form = _form(Stock, StockForm, STOCK_WRITE_FIELDS)(data=obj)
+            if not form.is_valid():
+                errors[index] = form_errors(form)
+                continue
+            stock = form.save(commit=False)
+            results.append(stock)
+            if old is None:
+                created.append(stock)
+            else:
+                updated.append((stock, old))
+        if errors:
+            raise APIError(400, errors)
+
+        Stock.objects.bulk_create(created)
+        # bulk_update() neither sets auto_now fields nor sends signals
+        updated_at = timezone.now()
+        for stock, _ in updated:
+            stock.updated_at = updated_at
+        Stock.objects.bulk_update([stock for stock, _ in updated], sorted(changed))
+        StockMovement.objects.record_many([
+            *(StockMovement(stock=stock, kind="RECEIPT", quantity=stock.quantity) for stock in created),
+            *(movement for stock, old in updated for movement in StockMovement.objects.changes(stock, *old)),
+        ])
+        SalesDailyRollup.objects.move_categories(
+            {stock.pk: old[2] for stock, old in updated if stock.category != old[2]}
+        )
+        bump("stock")
+    return [serialize(stock, fields) for stock in results]
+
+
+# One stock item
+@api_view("GET")
+def stock_detail(request, stock_id):
+    fields = selected_fields(request, STOCK_FIELDS)
+    row = Stock.objects.filter(pk=stock_id).values(*fields.values()).first()
+    if row is None:
+        raise APIError(404, {"id": ["No stock item with this id."]})
+    return JsonResponse(serialize(row, fields))
+
+
+# Stock picker suggestions for the sale forms
+@api_view("GET")
+def stock_autocomplete(request):
+    """
+    Up to ?limit= in-stock items whose name or category starts with ?q=,
+    by name. Cached for AUTOCOMPLETE_TIMEOUT seconds or until the stock
+    changes, whichever comes first.
+    """
+    try:
+        limit = int(request.GET.get("limit", AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= AUTOCOMPLETE_MAX_LIMIT:
+        raise APIError(400, {"limit": [f"Must be a whole number from 1 to {AUTOCOMPLETE_MAX_LIMIT}."]})
+    query = request.GET.get("q", "").strip()[:100]
+
+    def load():
+        return list(suggest_stocks(query, limit).values(*AUTOCOMPLETE_FIELDS))
+
+    # Hashed: cache keys must not contain spaces or control characters
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    results = cached("stock-autocomplete", ("stock",), load, limit, digest, timeout=AUTOCOMPLETE_TIMEOUT)
+    return JsonResponse({"results": results})
+
+
+# Stock quantity and value per category
+@api_view("GET")
+def stock_levels(request):
+    """
+    Current levels from the category totals, or past ones from the stock ledger.
+    """
+    at = request.GET.get("at")
+    if at:
+        try:
+            when = parse_datetime(at)
+        except ValueError:
+            when = None
+        if when is None:
+            raise APIError(400, {"at": ["Use an ISO 8601 date and time."]})
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        levels = StockMovement.objects.category_levels_at(when)
+    else:
+        when = timezone.now()
+        levels = {
+            category: (quantity, value)
+            for category, quantity, value in StockCategoryTotal.objects.values_list(
+                "category", "quantity", "value"
+            )
+        }
+    categories = [
+        {"category": category, "quantity": quantity, "value": value}
+        for category, (quantity, value) in sorted(levels.items())
+    ]
+    fields = selected_fields(
+        request, {"at": "at", "categories": "categories", "total_value": "total_value"}
+    )
+    data = {
+        "at": when,
+        "categories": categories,
+        "total_value": sum(value for _, value in levels.values()),
+    }
+    return JsonResponse({name: data[name] for name in fields})
+
+
+# Sales by date range and bulk create
+@api_view("GET", "POST")
+def sales(request):
+    fields = selected_fields(request, SALE_FIELDS)
+    if request.method == "POST":
+        created = save_sales(json_objects(request), request.user)
+        return JsonResponse({"results": [serialize(sale, fields) for sale in created]}, status=201)
+
+    start, end = date_param(request, "start"), date_param(request, "end")
+    queryset = Sale.objects.all()
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    return JsonResponse(paginate(request, queryset, fields, ("-date", "-id")))
+
+
+def save_sales(objects, agent):
+    """
+    Record `objects` as sales by `agent`, the same way recordOrder records lines.
+    - Every sale is validated before any stock is taken.
+    - All quantities are reserved with one UPDATE; nothing is taken if any is short.
+    """
+    SaleAPIForm = _form(Sale, SaleForm, SALE_WRITE_FIELDS)
+    today = timezone.now().date().isoformat()
+    sales, errors = [], {}
+    for index, obj in enumerate(objects):
+        unknown = unknown_keys(obj, SALE_WRITE_FIELDS)
+        if unknown:
+            errors[index] = unknown
+            continue
+        form = SaleAPIForm(data={"date": today, **obj})
+        if not form.is_valid():
+            errors[index] = form_errors(form)
+            continue
+        sale = form.save(commit=False)
+        sale.sales_agent = agent
+        sale.fill_prices()  # bulk_create skips Sale.save()
+        sales.append(sale)
+    if errors:
+        raise APIError(400, errors)
+
+    needed = Counter()
+    for sale in sales:
+        needed[sale.stock_item_id] += sale.quantity_sold
+    with transaction.atomic():
+        if not Stock.objects.deduct_many(needed):
+            short = Stock.objects.filter(pk__in=list(needed)).only("name", "quantity")
+            raise APIError(409, {
+                "stock": [
+                    {
+                        "stock_item": stock.id,
+                        "name": stock.name,
+                        "available": stock.quantity,
+                        "requested": needed[stock.id],
+                    }
+                    for stock in short
+                    if stock.quantity < needed[stock.id]
+                ]
+            })
+        Sale.objects.bulk_create(sales)
+        SalesDailyRollup.objects.add_sales(sales)
+        StockMovement.objects.record_many(
+            StockMovement(stock=sale.stock_item, kind="SALE", quantity=-sale.quantity_sold, sale=sale)
+            for sale in sales
+        )
+    return sales
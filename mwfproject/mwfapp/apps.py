@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class MwfappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mwfapp'
+
+    def ready(self):
+        from .caching import bump_after_migrate, bump_on_write
+        from .pagination import analyze_after_migrate
+        from .search import install_search_after_migrate
+
+        # Full-text search tables/triggers and trigram indexes live outside
+        # the migrations so they can be restored after SQLite rebuilds a
+        # table, and skipped on backends without them
+        post_migrate.connect(install_search_after_migrate, sender=self)
+
+        # Cached pages are keyed on a version per table; any write retires it
+        for model in ("Stock", "Sale", "User"):
+            sender = self.get_model(model)
+            post_save.connect(bump_on_write, sender=sender, dispatch_uid=f"bump-{model}-save")
+            post_delete.connect(bump_on_write, sender=sender, dispatch_uid=f"bump-{model}-delete")
+        post_migrate.connect(bump_after_migrate, sender=self)
+        # Table statistics for the lists' approximate counts on SQLite
+        post_migrate.connect(analyze_after_migrate, sender=self)
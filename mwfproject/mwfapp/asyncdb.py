@@ -0,0 +1,81 @@
+"""
+Concurrent read queries for the dashboard and reports, behind
+settings.CONCURRENT_QUERIES (DJANGO_CONCURRENT_QUERIES=1).
+
+Off, the default, those pages are ordinary sync views and run_queries()
+runs their queries in turn. On one CPU with SQLite that measured faster
+at p50 on every page, cold and warm: the database cannot work on the
+queries in parallel there, so worker threads and an event loop only add
+overhead.
+
+On, run_queries() runs each query in its own worker thread, on that
+thread's own database connection: a server database on a multi-core host
+works on them in parallel, and the drivers release the GIL while they
+wait. concurrent_view() then serves the page as a coroutine view that
+runs in a worker thread, not on the one thread ASGI shares among sync
+views. (Django's async ORM methods all run on that shared thread, one
+after another, so they give no concurrency.) Measure with load_test on
+the target host before turning it on.
+
+The worker threads are long-lived and shared by all requests, so each
+keeps its connection between requests under CONN_MAX_AGE, or hands it
+back to the pool, the way a request thread does; at most QUERY_THREADS
+connections are open for them. Inside a transaction the queries run in
+turn on the request's own connection, since other connections would not
+see its uncommitted writes.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+QUERY_THREADS = 8
+
+_executor = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix="run-queries")
+
+
+def _in_worker(query):
+    def run():
+        close_old_connections()
+        try:
+            return query()
+        finally:
+            close_old_connections()
+
+    return run
+
+
+def run_queries(*queries):
+    """The results of the callables `queries`, in order; at the same time if enabled."""
+    if not settings.CONCURRENT_QUERIES or connection.in_atomic_block:
+        return [query() for query in queries]
+    # A copy of the caller's context each, so the request profile sees the queries
+    futures = [
+        _executor.submit(contextvars.copy_context().run, _in_worker(query)) for query in queries
+    ]
+    return [future.result() for future in futures]
+
+
+def concurrent_view(view):
+    """
+    With CONCURRENT_QUERIES on, serve the sync `view` as a coroutine view
+    that runs it in a worker thread; otherwise return `view` unchanged.
+    Outermost decorator; the setting is read when the view is defined.
+    Inside a transaction the view runs on the request's own connection.
+    """
+    if not settings.CONCURRENT_QUERIES:
+        return view
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        def call():
+            return view(request, *args, **kwargs)
+
+        if await sync_to_async(lambda: connection.in_atomic_block)():
+            return await sync_to_async(call)()
+        return await sync_to_async(_in_worker(call), thread_sensitive=False)()
+
+    return inner
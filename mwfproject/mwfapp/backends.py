@@ -1,25 +1,99 @@
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Case, Q, Value, When
 
 User = get_user_model()
 
+# Failed logins allowed per identifier and per client address within
+# LOGIN_FAILURE_WINDOW seconds of the last failure
+LOGIN_FAILURE_LIMIT = 5
+LOGIN_FAILURE_IP_LIMIT = 50
+LOGIN_FAILURE_WINDOW = 15 * 60
+
+
+def client_ip(request):
+    # REMOTE_ADDR, or the address the last of TRUSTED_PROXIES proxies saw
+    proxies = getattr(settings, "TRUSTED_PROXIES", 0)
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        return hops[-min(proxies, len(hops))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def find_user(identifier):
+    """The user whose username or email is `identifier`; a username match wins."""
+    return (
+        User._default_manager.filter(Q(username=identifier) | Q(email=identifier))
+        .order_by(Case(When(username=identifier, then=Value(0)), default=Value(1)), "pk")
+        .first()
+    )
+
+
+def _account_key(identifier, user):
+    # The account's username when the identifier names one, so its username,
+    # its email and other cases of the username share one budget
+    name = user.username if user is not None else identifier
+    return f"login-failures:id:{name.strip().lower()}"
+
+
+def _failure_limits(request, account_key):
+    limits = {account_key: LOGIN_FAILURE_LIMIT}
+    if request is not None:
+        limits[f"login-failures:ip:{client_ip(request)}"] = LOGIN_FAILURE_IP_LIMIT
+    return limits
+
+
+def _throttled(request, account_key):
+    limits = _failure_limits(request, account_key)
+    counts = cache.get_many(limits)
+    return any(counts.get(key, 0) >= limit for key, limit in limits.items())
+
+
+def login_throttled(request, identifier):
+    """True while `identifier`'s account or the client has too many recent failed logins."""
+    return _throttled(request, _account_key(identifier, find_user(identifier)))
+
+
+def record_login_failure(request, account_key):
+    for key in _failure_limits(request, account_key):
+        # add() then incr(), so failures arriving together are all counted
+        # (incr() is atomic on memcached, Redis and the in-memory cache)
+        cache.add(key, 0, LOGIN_FAILURE_WINDOW)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired between the two calls
+            cache.add(key, 1, LOGIN_FAILURE_WINDOW)
+        # The window runs from the latest failure
+        cache.touch(key, LOGIN_FAILURE_WINDOW)
+
+
 class EmailOrUsernameModelBackend(ModelBackend):
 
     # Custom auth backend to allow login with either username or email.
-    
+    # One query finds the user, and every attempt that gets past the
+    # throttle costs exactly one password hash, whether or not it matched.
+
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None:
             username = kwargs.get(User.USERNAME_FIELD)
-        
-        # Try to fetch by username or email
-        try:
-            user_obj = User.objects.get(username=username)
-        except User.DoesNotExist:
-            try:
-                user_obj = User.objects.get(email=username)
-            except User.DoesNotExist:
-                return None
-
-        if user_obj.check_password(password) and self.user_can_authenticate(user_obj):
+        if username is None or password is None:
+            return None
+        user_obj = find_user(username)
+        account_key = _account_key(username, user_obj)
+        if _throttled(request, account_key):
+            # Stops authenticate() here, before any hashing
+            raise PermissionDenied
+
+        if user_obj is None:
+            # Hash anyway, so a miss takes as long as a wrong password
+            User().set_password(password)
+        elif user_obj.check_password(password) and self.user_can_authenticate(user_obj):
+            cache.delete(account_key)
             return user_obj
+        record_login_failure(request, account_key)
         return None
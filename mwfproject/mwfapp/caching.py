@@ -0,0 +1,81 @@
+"""
+Version tokens for cached pages and template fragments.
+
+Every cache key for a page built from the Stock, Sale or User tables
+includes that table's current version token. A write replaces the token,
+so keys built from the old one are never read again and their entries
+simply expire. Saving or deleting a row replaces it through the
+`post_save`/`post_delete` receivers connected in `MwfappConfig.ready`;
+writes that send no signals (`update()`, `bulk_create()`, raw SQL) call
+`bump()` themselves - every stock quantity change goes through the stock
+ledger and every sale write through the daily rollup, so those two are
+where it happens.
+
+Tokens are random rather than counters, so a bump made in a transaction
+that rolls back is never handed out again to a different write. The token
+is replaced once more when the transaction commits: a page cached by
+another request between the write and the commit was built from the old
+rows, and must not be served afterwards.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+TABLES = ("stock", "sale", "user")
+TIMEOUT = 60 * 60
+
+
+def _key(table):
+    return f"version:{table}"
+
+
+def _replace(tables):
+    # Tokens never expire; if one is evicted, version() issues a new one
+    cache.set_many({_key(table): uuid.uuid4().hex for table in tables}, None)
+
+
+def bump(*tables, using=DEFAULT_DB_ALIAS):
+    """Invalidate everything cached from `tables` (all of them if none given)."""
+    if using != DEFAULT_DB_ALIAS:
+        # Pages are only built from the default database; the stress and
+        # benchmark commands' own databases must not retire its tokens
+        return
+    tables = tables or TABLES
+    _replace(tables)
+    transaction.on_commit(lambda: _replace(tables), using=using)
+
+
+def version(*tables):
+    """A token for the current contents of `tables`, to use in a cache key."""
+    keys = [_key(table) for table in tables]
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            cache.add(key, uuid.uuid4().hex, None)
+            tokens[key] = cache.get(key)
+    return "-".join(tokens[key] for key in keys)
+
+
+def cached(name, tables, compute, *vary_on, timeout=TIMEOUT):
+    """
+    `compute()`, cached until `tables` change.
+
+    The version is read before `compute()` runs, so a result built while a
+    write is in flight is stored under a key the write has already retired.
+    """
+    key = ":".join([name, version(*tables), *map(str, vary_on)])
+    return cache.get_or_set(key, compute, timeout)
+
+
+def bump_on_write(sender, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    """`post_save`/`post_delete` receiver; the table is the model's name."""
+    if update_fields == {"last_login"}:
+        # Every login stamps it, and no cached page shows it
+        return
+    bump(sender._meta.model_name, using=using)
+
+
+def bump_after_migrate(using=DEFAULT_DB_ALIAS, **kwargs):
+    """`post_migrate` receiver: a migrated (or freshly created) database invalidates all."""
+    bump(using=using)
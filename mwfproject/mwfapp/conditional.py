@@ -0,0 +1,72 @@
+"""
+ETag / Last-Modified validators for the list, detail and report pages.
+
+A page's validators come from the tables it shows. List and report pages
+use the tables' version tokens (caching.version), which every save,
+delete and bulk write replaces, so checking them is a cache read rather
+than a query. Detail pages use their rows' count and newest `updated_at`
+(table_state), an aggregate over a primary key lookup; the count catches
+deletes, which leave the newest timestamp alone, and the timestamp gives
+a Last-Modified. An unchanged page is answered with 304 Not Modified
+before the view runs, so no page queries and no template rendering.
+
+The ETag also covers the user and their CSRF cookie (the page shows who is
+logged in and embeds a token derived from it), and no validators are sent
+while flash messages are waiting to be shown.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.contrib.auth import SESSION_KEY
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+
+def table_state(*querysets):
+    """
+    [(row count, newest updated_at)] for each queryset. Keep the querysets
+    narrow (a row and its relations): this runs on every request.
+    """
+    return [
+        tuple(queryset.order_by().aggregate(count=Count("*"), newest=Max("updated_at")).values())
+        for queryset in querysets
+    ]
+
+
+def conditional_page(state):
+    """
+    `condition()` for a page whose content depends on `state(request, ...)`.
+
+    `state` returns a list of values that change the page: version tokens,
+    (count, newest updated_at) pairs from table_state(), which also set
+    Last-Modified, and anything else such as today's date; or None to send
+    no validators. It runs once per request however many validators Django
+    asks for.
+    """
+
+    def validators(request, *args, **kwargs):
+        # (etag, last modified), both None when no validators are sent
+        if not hasattr(request, "_page_validators"):
+            found = None
+            if not len(messages.get_messages(request)):
+                found = state(request, *args, **kwargs)
+            if found is None:
+                request._page_validators = (None, None)
+            else:
+                # The session names the user without loading them
+                user = request.session.get(SESSION_KEY)
+                key = repr((found, user, request.META.get("CSRF_COOKIE")))
+                stamps = [item[1] for item in found if isinstance(item, tuple) and item[1]]
+                request._page_validators = (
+                    hashlib.md5(key.encode(), usedforsecurity=False).hexdigest(),
+                    max(stamps, default=None),
+                )
+        return request._page_validators
+
+    def etag(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,221 @@
+"""
+Streaming CSV and XLSX export of the sales and stock reports.
+
+Rows are read with `.values_list(...).iterator()` and written out as they
+arrive, so neither the queryset nor the file is held in memory and the
+client starts receiving data at once. XLSX is written as a minimal
+workbook (one sheet, inline strings) into a zip archive built on the fly;
+zipfile supports unseekable output, so no temporary file is needed.
+"""
+import csv
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+
+# (header, lookup) pairs for each export
+SALES_COLUMNS = [
+    ("Date", "date"),
+    ("Sale ID", "id"),
+    ("Customer", "customer_name"),
+    ("Item", "stock_item__name"),
+    ("Category", "stock_item__category"),
+    ("Quantity", "quantity_sold"),
+    ("Sale Price", "sale_price"),
+    ("Transport", "transport"),
+    ("Total", "total_price"),
+    ("Payment Method", "payment_method"),
+    ("Sales Agent", "sales_agent__username"),
+]
+STOCK_COLUMNS = [
+    ("Name", "name"),
+    ("Type", "type"),
+    ("Quantity", "quantity"),
+    ("Category", "category"),
+    ("Color", "color"),
+    ("Cost Price", "cost_price"),
+    ("Selling Price", "selling_price"),
+    ("Supplier", "supplier"),
+    ("Date Added", "date_added"),
+]
+# Keys of the agents report's leaderboard rows (mwfapp/reports.py)
+AGENT_COLUMNS = [
+    ("Sales Agent", "name"),
+    ("Sales", "sales"),
+    ("Units", "units"),
+    ("Revenue", "revenue"),
+    ("Average Ticket", "average_ticket"),
+]
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_rows(queryset, columns, ordering):
+    """Iterate over the column values of `queryset` without caching rows."""
+    return (
+        queryset.order_by(*ordering)
+        .values_list(*[lookup for _, lookup in columns])
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def export_response(rows, columns, filename, file_format="csv", sheet_name="Sheet1"):
+    """StreamingHttpResponse writing `rows` as `filename`.csv or .xlsx."""
+    header = [title for title, _ in columns]
+    if file_format == "xlsx":
+        content = stream_xlsx(header, rows, sheet_name)
+    else:
+        file_format = "csv"
+        content = stream_csv(header, rows)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+def _batches(rows, size=CHUNK_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Echo:
+    # csv.writer target that hands the formatted line straight back
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    """Yield the CSV (with a BOM so Excel reads it as UTF-8) a batch at a time."""
+    writer = csv.writer(_Echo())
+    yield ("\ufeff" + writer.writerow(header)).encode()
+    for batch in _batches(rows):
+        yield "".join(writer.writerow(row) for row in batch).encode()
+
+
+# --- XLSX ---------------------------------------------------------------
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+        "</Relationships>"
+    ),
+    # Cell styles: 0 default, 1 date, 2 bold header
+    "xl/styles.xml": (
+        f'<styleSheet xmlns="{_MAIN_NS}">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        "</styleSheet>"
+    ),
+}
+
+_EXCEL_EPOCH = datetime.date(1899, 12, 30)
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _cell(value, style=0):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f"<c><v>{format(value, 'f') if isinstance(value, Decimal) else value}</v></c>"
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return f'<c s="1"><v>{(value - _EXCEL_EPOCH).days}</v></c>'
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    style = f' s="{style}"' if style else ""
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values, style=0):
+    return "<row>" + "".join(_cell(value, style) for value in values) + "</row>"
+
+
+class _ZipStream:
+    # Unseekable file object for zipfile: written bytes are collected until
+    # the generator drains them into the response
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_xlsx(header, rows, sheet_name="Sheet1"):
+    """Yield an XLSX workbook with one sheet, compressed as it is written."""
+    output = _ZipStream()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in _STATIC_PARTS.items():
+            archive.writestr(name, _XML + xml)
+        archive.writestr(
+            "xl/workbook.xml",
+            f'{_XML}<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>'
+            f'<sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/>'
+            "</sheets></workbook>",
+        )
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                f'{_XML}<worksheet xmlns="{_MAIN_NS}"><sheetData>{_row(header, style=2)}'.encode()
+            )
+            yield output.drain()
+            for batch in _batches(rows):
+                sheet.write("".join(_row(row) for row in batch).encode())
+                yield output.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield output.drain()
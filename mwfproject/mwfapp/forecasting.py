@@ -0,0 +1,145 @@
+"""
+Demand forecasts and reorder points per stock item.
+
+forecast() reads units sold per item and day over the last HISTORY_DAYS
+(one grouped query) into an items x days matrix and fits simple
+exponential smoothing to every row at once: scipy.signal.lfilter runs the
+smoothing recurrence along the day axis for all items, for each factor in
+SMOOTHING_FACTORS, and each item keeps the factor with the smallest
+one-step-ahead error. The smoothed level is the item's daily demand and
+the error's spread sizes its safety stock:
+
+    reorder point   = demand x lead time + z x spread x sqrt(lead time)
+    suggested order = demand x (lead time + COVER_DAYS) + safety stock - quantity
+
+Rows are fitted in chunks across worker processes, and the results
+replace the StockForecast table. The forecast_demand command runs it; the
+dashboard only reads the table.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import django
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from scipy.signal import lfilter
+from scipy.stats import norm
+
+from .analytics import EpochDay, positions
+from .caching import bump
+from .models import Sale, Stock, StockForecast
+
+HISTORY_DAYS = 180
+LEAD_TIME_DAYS = 7
+SERVICE_LEVEL = 0.95
+# Days of sales a suggested order covers beyond the lead time
+COVER_DAYS = 30
+SMOOTHING_FACTORS = (0.05, 0.1, 0.2, 0.3, 0.5)
+# Days averaged for the starting level
+WARMUP_DAYS = 14
+# Items per task handed to a worker process
+CHUNK_SIZE = 2000
+
+
+def demand_history(start, end):
+    """
+    (stock ids, quantities, units) for every stock item: units is an
+    items x days float array of units sold from `start` to `end`.
+    """
+    stock = Stock.objects.order_by("id").values_list("id", "quantity")
+    ids = np.array([row[0] for row in stock], dtype=np.int64)
+    quantities = np.array([row[1] for row in stock], dtype=np.int64)
+
+    first = int(np.datetime64(start, "D").astype(np.int64))
+    days = (end - start).days + 1
+    rows = np.array(
+        Sale.objects.filter(date__gte=start, date__lte=end)
+        .values("stock_item_id", day=EpochDay("date"))
+        .annotate(units=Sum("quantity_sold"))
+        .values_list("stock_item_id", "day", "units")
+        .order_by(),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+
+    units = np.zeros((len(ids), days))
+    # Sales of an item deleted after the stock read are left out, as in
+    # analytics.load()
+    index, found = positions(ids, rows[:, 0])
+    units[index[found], rows[found, 1] - first] = rows[found, 2]
+    return ids, quantities, units
+
+
+def fit(units):
+    """
+    Simple exponential smoothing fitted to each row of `units`: (daily
+    demand, spread of the one-step error, smoothing factor) per row.
+    """
+    start = units[:, :WARMUP_DAYS].mean(axis=1)
+    demand = np.zeros(len(units))
+    spread = np.full(len(units), np.inf)
+    chosen = np.zeros(len(units))
+    for alpha in SMOOTHING_FACTORS:
+        # level[t] = alpha * units[t] + (1 - alpha) * level[t - 1]
+        level, _ = lfilter([alpha], [1, alpha - 1], units, axis=1, zi=((1 - alpha) * start)[:, None])
+        forecast = np.hstack([start[:, None], level[:, :-1]])
+        error = np.sqrt(np.mean((units - forecast) ** 2, axis=1))
+        better = error < spread
+        demand = np.where(better, level[:, -1], demand)
+        spread = np.where(better, error, spread)
+        chosen = np.where(better, alpha, chosen)
+    return demand, spread, chosen
+
+
+def _fit_chunks(units, workers):
+    chunks = [units[i:i + CHUNK_SIZE] for i in range(0, len(units), CHUNK_SIZE)]
+    if workers <= 1 or len(chunks) <= 1:
+        results = [fit(chunk) for chunk in chunks]
+    else:
+        # Workers import this module, so they set Django up first
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=django.setup) as pool:
+            results = list(pool.map(fit, chunks))
+    if not results:
+        return np.empty(0), np.empty(0), np.empty(0)
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def forecast(end=None, history_days=HISTORY_DAYS, lead_time=LEAD_TIME_DAYS,
+             service_level=SERVICE_LEVEL, workers=None):
+    """
+    Fit every stock item's demand up to `end` (yesterday by default, the
+    last full day) and replace the StockForecast table. Returns the number
+    of items.
+    """
+    end = end or date.today() - timedelta(days=1)
+    ids, quantities, units = demand_history(end - timedelta(days=history_days - 1), end)
+    demand, spread, alpha = _fit_chunks(units, workers or os.cpu_count() or 1)
+
+    safety = norm.ppf(service_level) * spread * math.sqrt(lead_time)
+    reorder_point = np.ceil(demand * lead_time + safety)
+    suggested = np.maximum(np.ceil(demand * (lead_time + COVER_DAYS) + safety - quantities), 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(demand > 0, quantities / demand, np.nan)
+
+    computed_at = timezone.now()
+    rows = [
+        StockForecast(
+            stock_id=int(ids[i]),
+            daily_demand=float(demand[i]),
+            demand_std=float(spread[i]),
+            smoothing=float(alpha[i]),
+            reorder_point=int(reorder_point[i]),
+            days_of_cover=None if np.isnan(cover[i]) else float(cover[i]),
+            suggested_order=int(suggested[i]),
+            computed_at=computed_at,
+        )
+        for i in range(len(ids))
+    ]
+    with transaction.atomic():
+        StockForecast.objects.all().delete()
+        StockForecast.objects.bulk_create(rows, batch_size=2000)
+        bump("forecast")
+    return len(rows)
@@ -8,6 +8,15 @@ from django.utils.timezone import now
 
 today = now().date()
 yesterday = today - timedelta(days=1)
+
+
+def recent_dates():
+    # Yesterday and today as of the call; the module-level values above are
+    # fixed at import, which in a long-running server is days ago
+    current = now().date()
+    return [current - timedelta(days=1), current]
+
+
 class UserForm(UserCreationForm):
     class Meta:
         model = User
@@ -69,7 +78,7 @@ class StockForm(forms.ModelForm):
 
     def clean_date_added(self):
         date = self.cleaned_data.get("date_added")
-        if date not in [yesterday, today]:
+        if date not in recent_dates():
             raise forms.ValidationError("Stock date must be today or yesterday.")
         return date
 
@@ -97,9 +106,21 @@ class SaleForm(forms.ModelForm):
         }
     def clean_date(self):
         date = self.cleaned_data.get("date")
-        if date not in [yesterday, today]:
+        if date not in recent_dates():
             raise forms.ValidationError("Date must be today or yesterday.")
         return date
+
+    def clean_quantity_sold(self):
+        quantity_sold = self.cleaned_data.get("quantity_sold")
+        if quantity_sold is not None and quantity_sold < 1:
+            raise forms.ValidationError("Quantity sold must be at least 1.")
+        return quantity_sold
+
+    def clean_sale_price(self):
+        sale_price = self.cleaned_data.get("sale_price")
+        if sale_price is not None and sale_price < 0:
+            raise forms.ValidationError("Sale price cannot be negative")
+        return sale_price
     # def clean_date(self):
     #     date = self.cleaned_data["date"]
     #     today = timezone.now().date()
@@ -0,0 +1,233 @@
+"""
+Bulk stock import from CSV or XLSX files.
+
+Rows are read one at a time and written in chunks, so memory use depends on
+the chunk size rather than the file size. Each row is validated with
+StockForm. Rows matching an existing item on (name, type, color, supplier)
+are treated as a new delivery of that item: the quantity is added and the
+other fields are overwritten. Every chunk is recorded in the stock ledger
+as receipts.
+"""
+import csv
+import io
+import os
+
+from django.db import connections, router, transaction
+from django.utils.timezone import now
+
+from .caching import bump
+from .forms import StockForm
+from .models import SalesDailyRollup, Stock, StockMovement
+
+NATURAL_KEY = ("name", "type", "color", "supplier")
+UPDATE_FIELDS = ["quantity", "category", "cost_price", "selling_price", "date_added", "updated_at"]
+MAX_REPORTED_ERRORS = 1000
+
+
+class StockImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []  # (row number, message), capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def _header(names):
+    return [str(name or "").strip().lower().replace(" ", "_") for name in names]
+
+
+def read_csv(fileobj):
+    """Yield one dict per CSV row; `fileobj` may be binary or text."""
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    reader = csv.reader(fileobj)
+    header = _header(next(reader, []))
+    for values in reader:
+        yield dict(zip(header, values))
+
+
+def read_xlsx(fileobj):
+    """Yield one dict per row of the first sheet, using openpyxl's streaming reader."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX import needs the openpyxl package; upload a CSV file instead.")
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = _header(next(rows, []))
+        for values in rows:
+            yield {key: "" if value is None else value for key, value in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """Pick the reader from the file extension."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        return read_csv(fileobj)
+    if extension in (".xlsx", ".xlsm"):
+        return read_xlsx(fileobj)
+    raise ValueError(f"Unsupported file type '{extension}'; use .csv or .xlsx.")
+
+
+def import_stock(rows, chunk_size=1000, on_error=None):
+    """
+    Validate and upsert stock rows, writing every `chunk_size` valid rows.
+
+    `on_error(row_number, message)` is called for each rejected row (row
+    numbers count the header as row 1).
+    """
+    result = StockImportResult()
+    chunk = []
+    for row_number, row in enumerate(rows, start=2):
+        row.setdefault("date_added", "")
+        if not row["date_added"]:
+            row["date_added"] = now().date()
+        form = StockForm(data=row, instance=Stock())
+        if not form.is_valid():
+            message = "; ".join(
+                f"{field}: {' '.join(errors)}" for field, errors in form.errors.items()
+            )
+            result.add_error(row_number, message)
+            if on_error:
+                on_error(row_number, message)
+            continue
+        chunk.append(form.instance)
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, result)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, result)
+    return result
+
+
+def _write_chunk(stocks, result):
+    # Merge rows for the same item within the chunk, then split them into
+    # inserts and quantity top-ups of items already in the database
+    incoming = {}
+    for stock in stocks:
+        key = tuple(getattr(stock, field) for field in NATURAL_KEY)
+        if key in incoming:
+            incoming[key].quantity += stock.quantity
+            for field in UPDATE_FIELDS[1:]:
+                setattr(incoming[key], field, getattr(stock, field))
+        else:
+            incoming[key] = stock
+
+    connection = connections[router.db_for_write(Stock)]
+    with transaction.atomic(using=connection.alias):
+        # Narrow by name (indexed), then match the full key here. The rows
+        # are locked so the ledger sees the figures the update starts from.
+        existing = {}
+        names = {key[0] for key in incoming}
+        for pk, *key, quantity, price, category in (
+            Stock.objects.select_for_update()
+            .filter(name__in=names)
+            .order_by("id")
+            .values_list("id", *NATURAL_KEY, "quantity", "selling_price", "category")
+        ):
+            key = tuple(key)
+            if key in incoming:
+                existing.setdefault(key, (pk, quantity, price, category))
+
+        to_create, to_update, movements, moves = [], [], [], {}
+        for key, stock in incoming.items():
+            if key in existing:
+                pk, quantity, price, category = existing[key]
+                to_update.append((pk, stock))
+                if stock.category != category:
+                    moves[pk] = category
+                # The item as it will be after the update, for the ledger
+                added = stock.quantity
+                stock.pk, stock.quantity = pk, quantity + added
+                movements += StockMovement.objects.changes(
+                    stock, quantity, price, category, kind="RECEIPT"
+                )
+                stock.quantity = added
+            else:
+                to_create.append(stock)
+
+        _create_new(connection, to_create)
+        _update_existing(connection, to_update)
+        movements += [
+            StockMovement(stock=stock, kind="RECEIPT", quantity=stock.quantity)
+            for stock in to_create
+        ]
+        StockMovement.objects.record_many(movements)
+        SalesDailyRollup.objects.move_categories(moves)
+        # The raw UPDATE sends no signal, and a row whose quantity and price
+        # are unchanged records no movement
+        bump("stock", using=connection.alias)
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+
+def _copy_supported(connection):
+    if connection.vendor != "postgresql":
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    return is_psycopg3
+
+
+def _create_new(connection, stocks):
+    # On PostgreSQL (psycopg 3) the rows go in with COPY, which skips
+    # per-statement parsing and planning. COPY cannot return the new ids,
+    # so they are taken from the table's sequence first.
+    if not stocks or not _copy_supported(connection):
+        Stock.objects.bulk_create(stocks)
+        return
+    meta = Stock._meta
+    qn = connection.ops.quote_name
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    columns = ", ".join(qn(field.column) for field in [meta.pk, *fields])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [qn(meta.db_table), meta.pk.column, len(stocks)],
+        )
+        for stock, (pk,) in zip(stocks, cursor.fetchall()):
+            stock.pk = pk
+        with cursor.copy(f"COPY {qn(meta.db_table)} ({columns}) FROM STDIN") as copy:
+            # Declared types spare psycopg from inspecting every value
+            copy.set_types([field.db_type(connection).split("(")[0] for field in [meta.pk, *fields]])
+            for stock in stocks:
+                copy.write_row(
+                    [stock.pk]
+                    + [field.get_db_prep_save(field.pre_save(stock, True), connection) for field in fields]
+                )
+    for stock in stocks:
+        stock._state.adding = False
+        stock._state.db = connection.alias
+
+
+def _update_existing(connection, updates):
+    # One prepared UPDATE run for every row: bulk_update would build a CASE
+    # per field with a WHEN per row, which costs far more than the write.
+    # The quantity is added to the live value so concurrent sales are kept.
+    if not updates:
+        return
+    meta = Stock._meta
+    qn = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in UPDATE_FIELDS[1:]]
+    quantity = qn(meta.get_field("quantity").column)
+    assignments = ", ".join(
+        [f"{quantity} = {quantity} + %s"] + [f"{qn(field.column)} = %s" for field in fields]
+    )
+    sql = f"UPDATE {qn(meta.db_table)} SET {assignments} WHERE {qn(meta.pk.column)} = %s"
+    params = [
+        [stock.quantity]
+        # pre_save() is what save() would write: the value, or now() for updated_at
+        + [field.get_db_prep_save(field.pre_save(stock, False), connection) for field in fields]
+        + [pk]
+        for pk, stock in updates
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
@@ -0,0 +1,197 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.test.utils import CaptureQueriesContext
+
+from mwfapp.models import Sale, Stock, User
+from mwfproject.database import sqlite_database
+
+BENCH_ALIAS = "benchmark"
+CATEGORIES = [
+    "Poles",
+    "Hardwood",
+    "Home Furniture",
+    "Office Furniture",
+    "Softwood",
+    "Timber",
+    "Garden Furniture",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway SQLite database with sales and compare EXPLAIN "
+        "QUERY PLAN output and timings of the hot queries without and with "
+        "the model indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Number of sales to seed.")
+        parser.add_argument("--stocks", type=int, default=2_000, help="Number of stock items to seed.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the best time is reported.")
+        parser.add_argument(
+            "--db",
+            default=os.path.join(tempfile.gettempdir(), "mwf_benchmark.sqlite3"),
+            help="SQLite file to seed. Reused if it already holds enough rows.",
+        )
+        parser.add_argument("--reseed", action="store_true", help="Delete and reseed the database file.")
+
+    def handle(self, *args, **options):
+        if options["reseed"] and os.path.exists(options["db"]):
+            os.remove(options["db"])
+
+        bench = dict(connections.databases["default"])
+        bench.update(sqlite_database(options["db"], settings.SQLITE_PRAGMAS))
+        connections.databases[BENCH_ALIAS] = bench
+        call_command("migrate", database=BENCH_ALIAS, verbosity=0)
+
+        if Sale.objects.using(BENCH_ALIAS).count() < options["rows"]:
+            self.seed(options["rows"], options["stocks"])
+
+        connection = connections[BENCH_ALIAS]
+        indexes = [(model, index) for model in (Sale, Stock) for index in model._meta.indexes]
+
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        self.run_queries("Without indexes", connection, options["repeat"])
+
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.add_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.run_queries("With indexes", connection, options["repeat"])
+
+    def seed(self, rows, stock_count):
+        self.stdout.write(f"Seeding {rows:,} sales into {connections.databases[BENCH_ALIAS]['NAME']} ...")
+        rng = random.Random(42)
+        db = Sale.objects.using(BENCH_ALIAS)
+        Sale.objects.using(BENCH_ALIAS).all().delete()
+        Stock.objects.using(BENCH_ALIAS).all().delete()
+
+        agents = [
+            User.objects.db_manager(BENCH_ALIAS).get_or_create(
+                username=f"bench_agent{i}", defaults={"role": "SALES_AGENT"}
+            )[0]
+            for i in range(50)
+        ]
+        stocks = Stock.objects.using(BENCH_ALIAS).bulk_create(
+            [
+                Stock(
+                    name=f"Item {i:05d}",
+                    type="Bench",
+                    quantity=rng.randint(0, 500),
+                    category=rng.choice(CATEGORIES),
+                    color="Natural",
+                    cost_price=Decimal(rng.randint(1, 400) * 1000),
+                    selling_price=Decimal(rng.randint(1, 600) * 1000),
+                    supplier=f"Supplier {i % 40}",
+                )
+                for i in range(stock_count)
+            ],
+            batch_size=1000,
+        )
+
+        today = date.today()
+        start = time.perf_counter()
+        batch = []
+        with transaction.atomic(using=BENCH_ALIAS):
+            for _ in range(rows):
+                sale_price = Decimal(rng.randint(1, 500) * 1000)
+                transport = (sale_price * Decimal("0.05")).quantize(Decimal("1"))
+                batch.append(
+                    Sale(
+                        stock_item=rng.choice(stocks),
+                        quantity_sold=rng.randint(1, 10),
+                        sale_price=sale_price,
+                        customer_name=f"Customer {rng.randint(1, 20_000)}",
+                        transport=transport,
+                        total_price=sale_price + transport,
+                        date=today - timedelta(days=rng.randint(0, 3 * 365)),
+                        payment_method=rng.choice(Sale.PAYMENT_CHOICES)[0],
+                        sales_agent=rng.choice(agents),
+                        status="COMPLETED",
+                    )
+                )
+                if len(batch) == 5000:
+                    db.bulk_create(batch)
+                    batch = []
+            if batch:
+                db.bulk_create(batch)
+        self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    def queries(self):
+        # Each entry mirrors the ORM calls made by the views
+        db = BENCH_ALIAS
+        today = date.today()
+        six_months_ago = date(today.year, today.month - 5 if today.month > 5 else 1, 1)
+        return [
+            (
+                "latest sales page",
+                lambda: list(Sale.objects.using(db).with_related().order_by("-date", "-id")[:10]),
+            ),
+            (
+                "daily total",
+                lambda: Sale.objects.using(db).filter(date=today).aggregate(total=Sum("total_price")),
+            ),
+            (
+                "monthly total",
+                lambda: Sale.objects.using(db).in_month(today).total_amount(),
+            ),
+            (
+                "six-month series",
+                lambda: list(
+                    Sale.objects.using(db)
+                    .filter(date__gte=six_months_ago)
+                    .annotate(month=TruncMonth("date"))
+                    .values("month")
+                    .annotate(total=Sum("total_price"))
+                    .order_by("month")
+                ),
+            ),
+            (
+                "category pie",
+                lambda: list(
+                    Stock.objects.using(db)
+                    .values("category")
+                    .annotate(total=Sum("quantity"))
+                    .order_by("-total")
+                ),
+            ),
+            (
+                "stocks page",
+                lambda: list(Stock.objects.using(db).order_by("name", "id")[:10]),
+            ),
+        ]
+
+    def run_queries(self, title, connection, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{title}"))
+        for label, run in self.queries():
+            with CaptureQueriesContext(connection) as captured:
+                run()
+            sql = captured.captured_queries[-1]["sql"]
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+
+            self.stdout.write(f"{label:<20} {min(timings) * 1000:10.2f} ms")
+            for step in plan:
+                self.stdout.write(f"    {step}")
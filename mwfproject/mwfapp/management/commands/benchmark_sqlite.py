@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.db.models import Count, Sum
+
+from mwfapp.models import SalesDailyRollup, Sale, Stock, StockMovement, User
+from mwfproject.database import sqlite_database
+
+BENCH_ALIAS = "sqlite_benchmark"
+CATEGORIES = ["Poles", "Hardwood", "Home Furniture", "Office Furniture", "Softwood", "Timber"]
+
+
+def read(agent_id, stocks):
+    # What the dashboard asks for: this month's and today's totals, stock count
+    today = date.today()
+    sales = Sale.objects.using(BENCH_ALIAS)
+    sales.filter(date__gte=today.replace(day=1)).aggregate(Sum("total_price"), Count("id"))
+    sales.filter(date=today).aggregate(Sum("total_price"))
+    Stock.objects.using(BENCH_ALIAS).count()
+
+
+def write(agent_id, stocks):
+    # One sale as recordSales records it
+    stock_id = random.randint(1, stocks)
+    with transaction.atomic(using=BENCH_ALIAS):
+        if not Stock.objects.using(BENCH_ALIAS).deduct(stock_id, 1):
+            return
+        stock = Stock.objects.using(BENCH_ALIAS).get(pk=stock_id)
+        sale = Sale.objects.using(BENCH_ALIAS).create(
+            stock_item=stock, quantity_sold=1, sale_price=stock.selling_price,
+            customer_name="Benchmark", payment_method="Cash", sales_agent_id=agent_id,
+        )
+        SalesDailyRollup.objects.using(BENCH_ALIAS).add_sale(sale)
+        StockMovement.objects.using(BENCH_ALIAS).record(stock, "SALE", -1, sale=sale)
+
+
+def worker(kind, agent_id, stocks, seconds):
+    """
+    Run `kind` requests back to back for `seconds` in this process; returns
+    (latencies, locked). Each one is a request: connections are closed or
+    kept afterwards according to CONN_MAX_AGE, as the request cycle does.
+    """
+    work = read if kind == "read" else write
+    latencies, locked = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            work(agent_id, stocks)
+        except OperationalError:
+            # "database is locked": gunicorn would answer this one with a 500
+            locked += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+        finally:
+            close_old_connections()
+    connections.close_all()
+    return latencies, locked
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent read/write throughput of SQLite's default "
+        "settings against the SQLITE_PRAGMAS profile in settings, with "
+        "reader and writer processes standing in for gunicorn workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sales", type=int, default=50_000, help="Sales to seed.")
+        parser.add_argument("--stocks", type=int, default=500, help="Stock items to seed.")
+        parser.add_argument("--readers", type=int, default=4, help="Reader processes.")
+        parser.add_argument("--writers", type=int, default=4, help="Writer processes.")
+        parser.add_argument("--seconds", type=float, default=10, help="Length of each run.")
+        parser.add_argument(
+            "--db",
+            default=os.path.join(tempfile.gettempdir(), "mwf_sqlite_benchmark.sqlite3"),
+            help="SQLite file to use; it is recreated for every profile.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Active profile: {settings.SQLITE_PRAGMAS or 'SQLite defaults'}")
+        self.stdout.write(
+            f"{'profile':<8} {'kind':<6} {'ok':>7} {'locked':>7} {'per s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        # SQLite's defaults against the settings' profile
+        for name, pragmas in [("default", {}), ("tuned", settings.SQLITE_PRAGMAS)]:
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                if os.path.exists(options["db"] + suffix):
+                    os.remove(options["db"] + suffix)
+            bench = dict(connections.databases["default"])
+            bench.update(sqlite_database(options["db"], pragmas))
+            connections.databases[BENCH_ALIAS] = bench
+            call_command("migrate", database=BENCH_ALIAS, verbosity=0)
+            agent_id = self.seed(options["sales"], options["stocks"])
+
+            # Forked children must not share the parent's connections
+            connections.close_all()
+            kinds = ["read"] * options["readers"] + ["write"] * options["writers"]
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(len(kinds), mp_context=context) as pool:
+                results = list(pool.map(
+                    worker, kinds, [agent_id] * len(kinds), [options["stocks"]] * len(kinds),
+                    [options["seconds"]] * len(kinds),
+                ))
+
+            for kind in ("read", "write"):
+                latencies = [s for k, (l, _) in zip(kinds, results) if k == kind for s in l]
+                locked = sum(n for k, (_, n) in zip(kinds, results) if k == kind)
+                cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+                self.stdout.write(
+                    f"{name:<8} {kind:<6} {len(latencies):>7} {locked:>7} "
+                    f"{len(latencies) / options['seconds']:>8.1f} "
+                    f"{cuts[49] * 1000:>8.1f} {cuts[98] * 1000:>8.1f}"
+                )
+            # Drop the wrapper too, or the next profile would reuse its settings
+            connections[BENCH_ALIAS].close()
+            del connections[BENCH_ALIAS]
+
+    def seed(self, sales, stock_count):
+        rng = random.Random(42)
+        agent = User.objects.db_manager(BENCH_ALIAS).create_user(
+            username="benchmark_agent", password="benchmark", role="SALES_AGENT"
+        )
+        Stock.objects.using(BENCH_ALIAS).bulk_create(
+            Stock(
+                name=f"Item {i}", type="Bench", quantity=1_000_000, category=rng.choice(CATEGORIES),
+                color="Brown", cost_price=500, selling_price=1000, supplier="Benchmark",
+            )
+            for i in range(stock_count)
+        )
+        today = date.today()
+        Sale.objects.using(BENCH_ALIAS).bulk_create(
+            (
+                Sale(
+                    stock_item_id=rng.randint(1, stock_count), quantity_sold=1,
+                    sale_price=Decimal(1000), total_price=Decimal(1000),
+                    customer_name="Seed", sales_agent_id=agent.pk,
+                    date=today - timedelta(days=rng.randint(0, 365)),
+                )
+                for _ in range(sales)
+            ),
+            batch_size=2000,
+        )
+        SalesDailyRollup.objects.using(BENCH_ALIAS).rebuild()
+        return agent.pk
@@ -0,0 +1,54 @@
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+APP_DIR = Path(__file__).resolve().parents[2]
+SOURCE = APP_DIR / "assets" / "tailwind.css"
+OUTPUT = APP_DIR / "static" / "css" / "tailwind.min.css"
+
+
+def compile_tailwind(output):
+    """Write the minified CSS for the classes mwfapp uses (see SOURCE) to `output`."""
+    try:
+        from tailwindcss_bin import find_tailwindcss_bin
+    except ImportError as exc:
+        raise CommandError("The Tailwind CLI is missing: pip install tailwindcss-bin.") from exc
+    result = subprocess.run(
+        [find_tailwindcss_bin(), "--input", SOURCE, "--output", output, "--minify"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise CommandError(f"tailwindcss failed:\n{result.stderr}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile the Tailwind classes used in mwfapp/templates and static/js into "
+        "static/css/tailwind.min.css. Commit the result; collectstatic then "
+        "gives it a hashed name and gzip/Brotli copies like any static file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if the committed CSS is out of date instead of writing it.",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            built = Path(tmp) / OUTPUT.name
+            compile_tailwind(built)
+            css = built.read_bytes()
+
+        if options["check"]:
+            if not OUTPUT.exists() or OUTPUT.read_bytes() != css:
+                raise CommandError(f"{OUTPUT} is out of date: run manage.py build_assets.")
+            self.stdout.write(self.style.SUCCESS(f"{OUTPUT.name} is up to date."))
+            return
+
+        OUTPUT.write_bytes(css)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {OUTPUT} ({len(css)} bytes)."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from mwfapp import forecasting
+from mwfapp.models import StockForecast
+from mwfapp.pagination import analyze
+
+
+class Command(BaseCommand):
+    help = (
+        "Forecast each stock item's daily demand from its sales and store "
+        "reorder points, days of cover and suggested orders in the "
+        "StockForecast table, which the dashboard's reorder panel reads. "
+        "Also refreshes the table statistics behind the lists' row "
+        "counts. Run it nightly (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--history-days", type=int, default=forecasting.HISTORY_DAYS,
+            help="Days of sales to fit (default %(default)s).",
+        )
+        parser.add_argument(
+            "--lead-time", type=int, default=forecasting.LEAD_TIME_DAYS,
+            help="Days between ordering and receiving stock (default %(default)s).",
+        )
+        parser.add_argument(
+            "--service-level", type=float, default=forecasting.SERVICE_LEVEL,
+            help="Chance of not running out before a delivery (default %(default)s).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Processes fitting items in parallel (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        if options["history_days"] < 1 or options["lead_time"] < 1:
+            raise CommandError("--history-days and --lead-time must be at least 1.")
+        if not 0 < options["service_level"] < 1:
+            raise CommandError("--service-level must be between 0 and 1.")
+
+        count = forecasting.forecast(
+            history_days=options["history_days"],
+            lead_time=options["lead_time"],
+            service_level=options["service_level"],
+            workers=options["workers"],
+        )
+        analyze(connection)
+        reorder = StockForecast.objects.reorder_needed().count()
+        self.stdout.write(
+            self.style.SUCCESS(f"Forecast {count} stock items; {reorder} at or below their reorder point.")
+        )
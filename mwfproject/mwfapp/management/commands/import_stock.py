@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mwfapp.importers import import_stock, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import stock items from a CSV or XLSX file, validating each row "
+        "like the stock form and adding to items that already exist."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file with a header row.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000, help="Valid rows written per batch."
+        )
+
+    def handle(self, *args, **options):
+        def report(row_number, message):
+            self.stderr.write(f"row {row_number}: {message}")
+
+        try:
+            with open(options["path"], "rb") as fileobj:
+                result = import_stock(
+                    read_rows(fileobj, options["path"]),
+                    chunk_size=options["chunk_size"],
+                    on_error=report,
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported stock: {result.created} created, {result.updated} updated, "
+                f"{result.failed} rejected."
+            )
+        )
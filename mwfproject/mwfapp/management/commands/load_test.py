@@ -0,0 +1,110 @@
+import http.client
+import http.cookiejar
+import statistics
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mwfapp.caching import bump
+
+DEFAULT_PATHS = ["/dashboard/", "/salesreport", "/stocksreport"]
+
+
+def login(base_url, username, password):
+    """Log in through the login form; returns the Cookie header for the session."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f"{base_url}/login/").read()
+    csrftoken = next((c.value for c in jar if c.name == "csrftoken"), "")
+    form = urllib.parse.urlencode({
+        "identifier": username, "password": password, "csrfmiddlewaretoken": csrftoken,
+    }).encode()
+    request = urllib.request.Request(
+        f"{base_url}/login/", data=form, headers={"Referer": f"{base_url}/login/"}
+    )
+    opener.open(request).read()
+    if not any(c.name == "sessionid" for c in jar):
+        raise CommandError(f"Could not log in to {base_url} as {username}.")
+    return "; ".join(f"{c.name}={c.value}" for c in jar)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test pages on one or more running servers and report p50/p95/p99 "
+        "latency, e.g. the WSGI and ASGI deployments of the same database: "
+        "gunicorn mwfproject.wsgi -b :8000 and uvicorn mwfproject.asgi:application "
+        "--port 8001, then load_test http://127.0.0.1:8000 http://127.0.0.1:8001."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("base_urls", nargs="+", help="e.g. http://127.0.0.1:8000")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per page.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Invalidate the page cache before every request (needs the servers' cache).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'server':<28} {'page':<16} {'ok':>5} {'err':>4} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7}"
+        )
+        for base_url in options["base_urls"]:
+            base_url = base_url.rstrip("/")
+            cookie = login(base_url, options["username"], options["password"])
+            for path in options["paths"]:
+                latencies, errors, elapsed = self.run(base_url, path, cookie, options)
+                if not latencies:
+                    self.stdout.write(f"{base_url:<28} {path:<16} {0:>5} {errors:>4}")
+                    continue
+                cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+                self.stdout.write(
+                    f"{base_url:<28} {path:<16} {len(latencies):>5} {errors:>4} "
+                    f"{cuts[49] * 1000:>8.1f} {cuts[94] * 1000:>8.1f} {cuts[98] * 1000:>8.1f} "
+                    f"{len(latencies) / elapsed:>7.1f}"
+                )
+
+    def run(self, base_url, path, cookie, options):
+        url = urllib.parse.urlsplit(base_url)
+        local = threading.local()
+        latencies, errors = [], []
+
+        def fetch(_):
+            # One keep-alive connection per worker thread
+            if not hasattr(local, "conn"):
+                local.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+            if options["cold"]:
+                bump()
+            start = time.perf_counter()
+            try:
+                local.conn.request("GET", path, headers={"Cookie": cookie})
+                response = local.conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                local.conn.close()
+                del local.conn
+                errors.append(path)
+                return
+            if response.status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(response.status)
+
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            # Warm up: connections, sessions and (unless --cold) the page cache
+            list(pool.map(fetch, range(options["concurrency"])))
+            latencies.clear()
+            errors.clear()
+            start = time.perf_counter()
+            list(pool.map(fetch, range(options["requests"])))
+            elapsed = time.perf_counter() - start
+        return latencies, len(errors), elapsed
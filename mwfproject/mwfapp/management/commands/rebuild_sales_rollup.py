@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mwfapp.models import SalesAgentDailyRollup, SalesDailyRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SalesDailyRollup and SalesAgentDailyRollup tables from the Sale table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SalesDailyRollup.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {SalesDailyRollup.objects.count()} sales rollup rows and "
+                f"{SalesAgentDailyRollup.objects.count()} agent rollup rows."
+            )
+        )
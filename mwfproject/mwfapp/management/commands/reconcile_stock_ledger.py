@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from mwfapp.models import Stock, StockCategoryTotal, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the stock ledger against Stock.quantity and the category "
+        "totals against the Stock table; --fix records adjustments for any "
+        "drift and rebuilds the category totals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true", help="Record adjustments and rebuild the category totals."
+        )
+
+    def handle(self, *args, **options):
+        ledger = (
+            StockMovement.objects.filter(stock=OuterRef("pk"))
+            .order_by()
+            .values("stock")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        drifted = list(
+            Stock.objects.annotate(
+                ledger=Coalesce(Subquery(ledger, output_field=IntegerField()), 0)
+            )
+            .exclude(quantity=F("ledger"))
+            .order_by("id")
+        )
+        for stock in drifted:
+            self.stdout.write(
+                f"{stock.name} (#{stock.id}): quantity {stock.quantity}, ledger {stock.ledger}"
+            )
+
+        expected = {
+            row["category"]: (row["quantity"], row["value"])
+            for row in Stock.objects.with_value()
+            .values("category")
+            .annotate(quantity=Sum("quantity"), value=Sum("value"))
+            .order_by()
+        }
+        cached = {
+            category: (quantity, value)
+            for category, quantity, value in StockCategoryTotal.objects.values_list(
+                "category", "quantity", "value"
+            )
+        }
+        wrong_categories = [
+            category
+            for category in sorted(set(expected) | set(cached))
+            if cached.get(category, (0, 0)) != expected.get(category, (0, 0))
+        ]
+        for category in wrong_categories:
+            self.stdout.write(
+                f"Category {category}: totals {cached.get(category, (0, 0))}, "
+                f"stock table {expected.get(category, (0, 0))}"
+            )
+
+        if not drifted and not wrong_categories:
+            self.stdout.write(self.style.SUCCESS("Stock ledger and category totals agree."))
+            return
+        if not options["fix"]:
+            raise CommandError(
+                f"{len(drifted)} stock items and {len(wrong_categories)} categories "
+                f"disagree; run with --fix to correct them."
+            )
+
+        with transaction.atomic():
+            StockMovement.objects.record_many(
+                StockMovement(stock=stock, kind="ADJUSTMENT", quantity=stock.quantity - stock.ledger)
+                for stock in drifted
+            )
+            StockCategoryTotal.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recorded {len(drifted)} adjustments and rebuilt the category totals."
+            )
+        )
+
@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import Sum
+
+from mwfapp.models import Sale, SalesDailyRollup, Stock, StockMovement, User
+from mwfproject.database import sqlite_database
+
+STRESS_ALIAS = "stress"
+
+
+def attempt_sale(stock_id, agent_id, quantity, retries=20):
+    """
+    One sale through Sale.objects.sell(), the code recordSales runs. Returns
+    the units sold (0 if out of stock, None if the database stayed locked
+    for every retry).
+    """
+    try:
+        for _ in range(retries):
+            try:
+                stock = Stock.objects.using(STRESS_ALIAS).get(pk=stock_id)
+                sale = Sale.objects.using(STRESS_ALIAS).sell(
+                    stock,
+                    quantity,
+                    sale_price=Decimal(quantity * 1000),
+                    customer_name="Stress test",
+                    payment_method="Cash",
+                    sales_agent_id=agent_id,
+                )
+                return quantity if sale else 0
+            except OperationalError:
+                time.sleep(random.uniform(0.001, 0.02))
+        return None
+    finally:
+        connections[STRESS_ALIAS].close()
+
+
+def attempt_sales(stock_id, agent_id, quantities):
+    # Runs in a worker process: fire this process's share of sales
+    # from a few threads at once
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        return list(pool.map(lambda q: attempt_sale(stock_id, agent_id, q), quantities))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire many simultaneous sales at one stock item from threads and "
+        "processes and check the quantity never goes negative or drifts "
+        "from the recorded sales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=500, help="Sales fired per phase.")
+        parser.add_argument("--quantity", type=int, default=300, help="Starting stock quantity.")
+        parser.add_argument("--threads", type=int, default=32, help="Threads in the thread phase.")
+        parser.add_argument("--processes", type=int, default=8, help="Processes in the process phase.")
+        parser.add_argument(
+            "--db",
+            default=os.path.join(tempfile.gettempdir(), "mwf_stress.sqlite3"),
+            help="SQLite file to use; it is recreated on every run.",
+        )
+
+    def handle(self, *args, **options):
+        if os.path.exists(options["db"]):
+            os.remove(options["db"])
+        stress = dict(connections.databases["default"])
+        stress.update(sqlite_database(options["db"], settings.SQLITE_PRAGMAS))
+        connections.databases[STRESS_ALIAS] = stress
+        call_command("migrate", database=STRESS_ALIAS, verbosity=0)
+
+        agent = User.objects.db_manager(STRESS_ALIAS).create_user(
+            username="stress_agent", password="stress", role="SALES_AGENT"
+        )
+        stock = Stock.objects.using(STRESS_ALIAS).create(
+            name="Stress Pole", type="Test", quantity=0, category="Poles",
+            color="Brown", cost_price=500, selling_price=1000, supplier="Stress",
+        )
+        rng = random.Random(7)
+
+        for phase in ("threads", "processes"):
+            with transaction.atomic(using=STRESS_ALIAS):
+                left = Stock.objects.using(STRESS_ALIAS).get(pk=stock.pk).quantity
+                Stock.objects.using(STRESS_ALIAS).filter(pk=stock.pk).update(quantity=options["quantity"])
+                StockMovement.objects.using(STRESS_ALIAS).record(
+                    stock, "ADJUSTMENT", options["quantity"] - left
+                )
+            sales = Sale.objects.using(STRESS_ALIAS).all()
+            SalesDailyRollup.objects.using(STRESS_ALIAS).remove_sales(sales)
+            sales.delete()
+            quantities = [rng.randint(1, 3) for _ in range(options["attempts"])]
+
+            start = time.perf_counter()
+            if phase == "threads":
+                with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+                    results = list(
+                        pool.map(lambda q: attempt_sale(stock.pk, agent.pk, q), quantities)
+                    )
+            else:
+                # Forked children must not share the parent's connections
+                connections.close_all()
+                chunks = [quantities[i :: options["processes"]] for i in range(options["processes"])]
+                context = multiprocessing.get_context("fork")
+                with ProcessPoolExecutor(options["processes"], mp_context=context) as pool:
+                    results = [
+                        result
+                        for chunk in pool.map(attempt_sales, [stock.pk] * len(chunks), [agent.pk] * len(chunks), chunks)
+                        for result in chunk
+                    ]
+            elapsed = time.perf_counter() - start
+
+            self.check_phase(phase, stock, options["quantity"], results, elapsed)
+
+    def check_phase(self, phase, stock, starting, results, elapsed):
+        remaining = Stock.objects.using(STRESS_ALIAS).get(pk=stock.pk).quantity
+        recorded = (
+            Sale.objects.using(STRESS_ALIAS)
+            .filter(stock_item_id=stock.pk)
+            .aggregate(units=Sum("quantity_sold"))["units"]
+            or 0
+        )
+        sold = sum(r for r in results if r)
+        rejected = sum(1 for r in results if r == 0)
+        locked = sum(1 for r in results if r is None)
+
+        self.stdout.write(
+            f"{phase:<10} {len(results)} attempts in {elapsed:.2f}s: "
+            f"{sold} units sold, {rejected} rejected, {locked} gave up on locks, "
+            f"{remaining} left"
+        )
+        if remaining < 0:
+            raise CommandError(f"{phase}: stock went negative ({remaining}).")
+        if starting - remaining != recorded or recorded != sold:
+            raise CommandError(
+                f"{phase}: stock dropped by {starting - remaining} but sales "
+                f"record {recorded} units ({sold} reported sold)."
+            )
+        rolled_up = (
+            SalesDailyRollup.objects.using(STRESS_ALIAS).aggregate(units=Sum("units"))["units"] or 0
+        )
+        if rolled_up != recorded:
+            raise CommandError(f"{phase}: the daily rollup has {rolled_up} units, sales {recorded}.")
+
+        # Every running balance must follow from the one before it
+        balance = 0
+        for quantity, stock_balance in (
+            StockMovement.objects.using(STRESS_ALIAS)
+            .filter(stock_id=stock.pk)
+            .order_by("id")
+            .values_list("quantity", "stock_balance")
+        ):
+            balance += quantity
+            if stock_balance != balance:
+                raise CommandError(
+                    f"{phase}: ledger balance {stock_balance} after a movement of "
+                    f"{quantity}, expected {balance}."
+                )
+        if balance != remaining:
+            raise CommandError(f"{phase}: ledger says {balance} left, stock says {remaining}.")
@@ -0,0 +1,84 @@
+"""
+Response compression and request profiling.
+
+CompressionMiddleware is Django's GZipMiddleware with Brotli preferred
+when the client accepts it: JSON compresses noticeably better with it at
+a similar cost. Brotli is optional; without it responses are gzipped.
+It is applied per view with `compress_page` rather than site-wide, since
+compressing HTML that embeds a CSRF token exposes it to BREACH.
+
+ProfilingMiddleware times every request with mwfapp.profiling; settings
+add it, outermost, when DJANGO_PROFILING=1.
+"""
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+
+from . import profiling
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is in requirements.txt
+    brotli = None
+
+# Quality 11 (the default) is meant for static files; 5 is about as fast as gzip
+BROTLI_QUALITY = 5
+
+re_accepts_brotli = re.compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < 200
+            or not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        # Same as GZipMiddleware: the encoded body is no longer byte-identical
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+compress_page = decorator_from_middleware(CompressionMiddleware)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        profiling.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = profiling.start()
+        response = self.get_response(request)
+        profiling.finish(token, request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = profiling.start()
+        response = await self.get_response(request)
+        profiling.finish(token, request, response)
+        return response
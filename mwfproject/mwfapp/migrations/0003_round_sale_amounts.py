@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def round_sale_amounts(apps, schema_editor):
+    # Older rows kept the unrounded 5% transport (e.g. 1250.05). Reading them
+    # through the model already rounds them, so writing them back stores the
+    # value every page has been displaying and lets SQL sums match it.
+    Sale = apps.get_model("mwfapp", "Sale")
+    db_alias = schema_editor.connection.alias
+    batch = []
+    for sale in Sale.objects.using(db_alias).only("id", "transport", "total_price").iterator(chunk_size=2000):
+        batch.append(sale)
+        if len(batch) >= 2000:
+            Sale.objects.using(db_alias).bulk_update(batch, ["transport", "total_price"])
+            batch = []
+    if batch:
+        Sale.objects.using(db_alias).bulk_update(batch, ["transport", "total_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0002_alter_sale_sale_price_alter_sale_total_price_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(round_sale_amounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0003_round_sale_amounts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date', 'id'], name='sale_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['name', 'id'], name='stock_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['category', 'quantity'], name='stock_category_qty_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:48
+
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, Sum
+
+
+def build_rollup(apps, schema_editor):
+    # Fill the rollup from the existing sales (same math as rebuild_sales_rollup)
+    Sale = apps.get_model("mwfapp", "Sale")
+    SalesDailyRollup = apps.get_model("mwfapp", "SalesDailyRollup")
+    db_alias = schema_editor.connection.alias
+    groups = (
+        Sale.objects.using(db_alias).annotate(
+            amount_value=ExpressionWrapper(
+                F("sale_price") * F("quantity_sold") + F("transport"),
+                output_field=models.DecimalField(max_digits=20, decimal_places=0),
+            )
+        )
+        .values("date", "stock_item__category", "payment_method")
+        .annotate(
+            sale_count=Count("id"),
+            units=Sum("quantity_sold"),
+            total=Sum("total_price"),
+            amount_total=Sum("amount_value"),
+        )
+        .order_by()
+    )
+    SalesDailyRollup.objects.using(db_alias).bulk_create(
+        [
+            SalesDailyRollup(
+                day=group["date"],
+                category=group["stock_item__category"],
+                payment_method=group["payment_method"],
+                sale_count=group["sale_count"],
+                units=group["units"],
+                total_price=group["total"],
+                amount=group["amount_total"],
+            )
+            for group in groups.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0004_sale_stock_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(blank=True, max_length=50)),
+                ('sale_count', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=0, default=0, max_digits=16)),
+                ('amount', models.DecimalField(decimal_places=0, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'category', 'payment_method'), name='sales_rollup_key')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0005_salesdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['customer_name'], name='sale_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['supplier'], name='stock_supplier_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:55
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0006_search_fallback_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(max_length=100)),
+                ('payment_method', models.CharField(blank=True, choices=[('Cash', 'Cash'), ('Mobile Money', 'Mobile Money'), ('Cheque', 'Cheque'), ('Bank Transfer', 'Bank Transfer')], default='Cash', max_length=50)),
+                ('date', models.DateField(default=datetime.date.today)),
+                ('sales_agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='mwfapp.order'),
+        ),
+    ]
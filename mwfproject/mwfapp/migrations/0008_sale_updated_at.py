@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0007_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
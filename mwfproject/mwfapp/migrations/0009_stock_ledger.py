@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    # One opening movement per existing stock item, and the category totals
+    Stock = apps.get_model("mwfapp", "Stock")
+    StockMovement = apps.get_model("mwfapp", "StockMovement")
+    StockCategoryTotal = apps.get_model("mwfapp", "StockCategoryTotal")
+    db_alias = schema_editor.connection.alias
+    totals = {}
+    batch = []
+    for stock in Stock.objects.using(db_alias).order_by("id").iterator(chunk_size=2000):
+        value = stock.quantity * stock.selling_price
+        quantity_total, value_total = totals.get(stock.category, (0, 0))
+        totals[stock.category] = (quantity_total + stock.quantity, value_total + value)
+        batch.append(
+            StockMovement(
+                stock_id=stock.id,
+                category=stock.category,
+                kind="OPENING",
+                quantity=stock.quantity,
+                value=value,
+                stock_balance=stock.quantity,
+                category_balance=totals[stock.category][0],
+                category_value=totals[stock.category][1],
+            )
+        )
+        if len(batch) >= 2000:
+            StockMovement.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    StockMovement.objects.using(db_alias).bulk_create(batch)
+    StockCategoryTotal.objects.using(db_alias).bulk_create(
+        StockCategoryTotal(category=category, quantity=quantity, value=value)
+        for category, (quantity, value) in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0008_sale_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50, unique=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=0, default=0, max_digits=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50)),
+                ('kind', models.CharField(choices=[('OPENING', 'Opening balance'), ('RECEIPT', 'Receipt'), ('SALE', 'Sale'), ('REVERSAL', 'Sale edit reversal'), ('DELETION', 'Sale deletion'), ('ADJUSTMENT', 'Adjustment'), ('WRITE_OFF', 'Stock item removed')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('value', models.DecimalField(decimal_places=0, max_digits=20)),
+                ('stock_balance', models.IntegerField()),
+                ('category_balance', models.IntegerField()),
+                ('category_value', models.DecimalField(decimal_places=0, max_digits=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='mwfapp.sale')),
+                ('stock', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='mwfapp.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stock', 'created_at'], name='movement_stock_time_idx'), models.Index(fields=['category', 'created_at'], name='movement_category_time_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0009_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['updated_at'], name='sale_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['updated_at'], name='stock_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0011_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.functions.text.Upper('name'), models.F('id'), name='stock_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.functions.text.Upper('category'), django.db.models.functions.text.Upper('name'), name='stock_category_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0012_stock_picker_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockForecast',
+            fields=[
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='mwfapp.stock')),
+                ('daily_demand', models.FloatField()),
+                ('demand_std', models.FloatField()),
+                ('smoothing', models.FloatField()),
+                ('reorder_point', models.IntegerField()),
+                ('days_of_cover', models.FloatField(null=True)),
+                ('suggested_order', models.IntegerField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
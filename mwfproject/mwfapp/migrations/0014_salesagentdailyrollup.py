@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, Sum
+
+
+def build_rollup(apps, schema_editor):
+    # Fill the rollup from the existing sales (same math as rebuild_sales_rollup)
+    Sale = apps.get_model("mwfapp", "Sale")
+    SalesAgentDailyRollup = apps.get_model("mwfapp", "SalesAgentDailyRollup")
+    db_alias = schema_editor.connection.alias
+    groups = (
+        Sale.objects.using(db_alias).annotate(
+            amount_value=ExpressionWrapper(
+                F("sale_price") * F("quantity_sold") + F("transport"),
+                output_field=models.DecimalField(max_digits=20, decimal_places=0),
+            )
+        )
+        .values("date", "sales_agent")
+        .annotate(
+            sale_count=Count("id"),
+            units=Sum("quantity_sold"),
+            total=Sum("total_price"),
+            amount_total=Sum("amount_value"),
+        )
+        .order_by()
+    )
+    SalesAgentDailyRollup.objects.using(db_alias).bulk_create(
+        [
+            SalesAgentDailyRollup(
+                day=group["date"],
+                sales_agent_id=group["sales_agent"],
+                sale_count=group["sale_count"],
+                units=group["units"],
+                total_price=group["total"],
+                amount=group["amount_total"],
+            )
+            for group in groups.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0013_stockforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesAgentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sale_count', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=0, default=0, max_digits=16)),
+                ('amount', models.DecimalField(decimal_places=0, default=0, max_digits=16)),
+                ('sales_agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sales_agent', 'day'], name='sales_agent_rollup_agent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'sales_agent'), name='sales_agent_rollup_key')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mwfapp', '0014_salesagentdailyrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sale',
+            name='sale_customer_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stock',
+            name='stock_supplier_idx',
+        ),
+    ]
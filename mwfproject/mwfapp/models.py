@@ -1,10 +1,14 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Cast, Upper
 from django.contrib.auth.models import AbstractUser
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
 from django.conf import settings
 from django.utils import timezone
 
+from .caching import bump
+
 class User(AbstractUser):
     ROLE_CHOICES = [
         ('MANAGER', 'Manager'),
@@ -13,10 +17,62 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, unique=False, choices=ROLE_CHOICES)
     phone = models.CharField(max_length=20, blank=True, null=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # login by email (EmailOrUsernameModelBackend)
+            models.Index(fields=["email"], name="user_email_idx"),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.phone}"
 
 
+class StockQuerySet(models.QuerySet):
+    def with_value(self):
+        # Per-row stock value (selling_price * quantity) computed in SQL
+        return self.annotate(
+            value=ExpressionWrapper(
+                F("selling_price") * F("quantity"),
+                output_field=models.DecimalField(max_digits=20, decimal_places=0),
+            )
+        )
+
+    def deduct(self, stock_id, quantity):
+        # UPDATE ... SET quantity = quantity - n WHERE id = ? AND quantity >= n;
+        # False (and nothing changed) if not enough stock is left
+        updated = self.filter(pk=stock_id, quantity__gte=quantity).update(
+            quantity=F("quantity") - quantity, updated_at=timezone.now()
+        )
+        return updated == 1
+
+    def deduct_many(self, quantities):
+        # Same as deduct() for several items ({stock_id: quantity}) in one
+        # set-based UPDATE; all or nothing
+        needed = Case(
+            *[When(pk=pk, then=Value(n)) for pk, n in quantities.items()],
+            output_field=models.IntegerField(),
+        )
+        with transaction.atomic(using=self.db):
+            updated = self.filter(pk__in=list(quantities), quantity__gte=needed).update(
+                quantity=F("quantity") - needed, updated_at=timezone.now()
+            )
+            if updated != len(quantities):
+                transaction.set_rollback(True, using=self.db)
+                return False
+        return True
+
+    def restore(self, stock_id, quantity):
+        # Put units back on the shelf, e.g. when a sale is edited or deleted
+        self.filter(pk=stock_id).update(
+            quantity=F("quantity") + quantity, updated_at=timezone.now()
+        )
+
+    def valuation(self):
+        # Total value of the queryset as a single aggregate query
+        total = self.with_value().aggregate(total=Sum("value"))["total"]
+        return total or 0
+
+
 class Stock(models.Model):
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=50)
@@ -27,11 +83,100 @@ class Stock(models.Model):
     selling_price = models.DecimalField(max_digits=10, decimal_places=0)
     supplier = models.CharField(max_length=100)
     date_added = models.DateField(default=timezone.now)
+    # Set by save(); update()s of the row set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StockQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # stocksPage / stocks_report ordering
+            models.Index(fields=["name", "id"], name="stock_name_id_idx"),
+            # dashboard category pie: covers the GROUP BY category SUM(quantity)
+            models.Index(fields=["category", "quantity"], name="stock_category_qty_idx"),
+            # conditional GETs: newest change to the table
+            models.Index(fields=["updated_at"], name="stock_updated_idx"),
+            # stock picker: case-insensitive name and category prefix ranges
+            models.Index(Upper("name"), "id", name="stock_name_upper_idx"),
+            models.Index(Upper("category"), Upper("name"), name="stock_category_upper_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category})"
 
 
+class SaleQuerySet(models.QuerySet):
+    def with_related(self):
+        # Join the stock item and agent that listings and Sale.__str__ render
+        return self.select_related("stock_item", "sales_agent")
+
+    def with_stock(self):
+        # Join just the stock item, for listings that leave the agent out
+        return self.select_related("stock_item")
+
+    def rollup_groups(self):
+        # Per day/category/payment method totals in SalesDailyRollup's shape
+        return (
+            self.with_amount()
+            .values("date", "stock_item__category", "payment_method")
+            .annotate(
+                sale_count=Count("id"),
+                units=Sum("quantity_sold"),
+                total=Sum("total_price"),
+                amount_total=Sum("amount_value"),
+            )
+            .order_by()
+        )
+
+    def agent_rollup_groups(self):
+        # Per day/sales agent totals in SalesAgentDailyRollup's shape
+        return (
+            self.with_amount()
+            .values("date", "sales_agent")
+            .annotate(
+                sale_count=Count("id"),
+                units=Sum("quantity_sold"),
+                total=Sum("total_price"),
+                amount_total=Sum("amount_value"),
+            )
+            .order_by()
+        )
+
+    def sell(self, stock, quantity_sold, **fields):
+        # Record one sale of `stock` as recordSales does: a conditional
+        # deduction, then the Sale row, its rollup figures and its ledger
+        # movement, all in one transaction. None (and nothing written) if
+        # not enough stock is left.
+        with transaction.atomic(using=self.db):
+            if not Stock.objects.using(self.db).deduct(stock.pk, quantity_sold):
+                return None
+            sale = self.create(stock_item=stock, quantity_sold=quantity_sold, **fields)
+            SalesDailyRollup.objects.using(self.db).add_sale(sale)
+            StockMovement.objects.using(self.db).record(stock, "SALE", -quantity_sold, sale=sale)
+        return sale
+
+    def in_month(self, day):
+        # Date-range filter for the month containing `day`; unlike
+        # date__month it can use the date index
+        first = day.replace(day=1)
+        next_first = (first + timedelta(days=32)).replace(day=1)
+        return self.filter(date__gte=first, date__lt=next_first)
+
+    def with_amount(self):
+        # Same math as Sale.amount: (sale_price * quantity_sold) + transport
+        return self.annotate(
+            amount_value=ExpressionWrapper(
+                F("sale_price") * F("quantity_sold") + F("transport"),
+                output_field=models.DecimalField(max_digits=20, decimal_places=0),
+            )
+        )
+
+    def total_amount(self):
+        # Sum of Sale.amount over the queryset as a single aggregate query
+        total = self.with_amount().aggregate(total=Sum("amount_value"))["total"]
+        return total or 0
+
+
 class Sale(models.Model):
     PAYMENT_CHOICES = [
         ('Cash', 'Cash'),
@@ -56,16 +201,481 @@ class Sale(models.Model):
     payment_method = models.CharField(max_length=50, choices=PAYMENT_CHOICES, default='Cash', blank=True)
     sales_agent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="lines", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SaleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # latest-first listings, daily/monthly totals and the chart window
+            models.Index(fields=["date", "id"], name="sale_date_id_idx"),
+            # conditional GETs: newest change to the table
+            models.Index(fields=["updated_at"], name="sale_updated_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        if self.transport == 0:
-            self.transport = Decimal(self.sale_price) * Decimal('0.05')
-            self.total_price = self.sale_price + self.transport
+        self.fill_prices()
         super().save(*args, **kwargs)
 
+    def fill_prices(self):
+        # Called by save(); call it directly before bulk_create
+        if self.transport == 0:
+            transport = Decimal(self.sale_price) * Decimal('0.05')
+            self.total_price = Decimal(self.sale_price) + transport
+            self.transport = transport
+        # Round to the stored precision (the same way values are read back)
+        # so SQL aggregates agree with the Python math
+        self.sale_price = Decimal(self.sale_price).quantize(Decimal('1'))
+        self.transport = Decimal(self.transport).quantize(Decimal('1'))
+        self.total_price = Decimal(self.total_price).quantize(Decimal('1'))
+
     @property
     def amount(self):
         return (self.sale_price * self.quantity_sold) + self.transport
 
     def __str__(self):
         return f"{self.stock_item.name} sold to {self.customer_name} by {self.sales_agent} on {self.date}"
+
+
+class Order(models.Model):
+    """One customer purchase of several stock items; each line is a Sale."""
+
+    customer_name = models.CharField(max_length=100)
+    payment_method = models.CharField(max_length=50, choices=Sale.PAYMENT_CHOICES, default='Cash', blank=True)
+    sales_agent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date = models.DateField(default=date.today)
+
+    def __str__(self):
+        return f"Order {self.id} for {self.customer_name} on {self.date}"
+
+
+class SalesDailyRollupQuerySet(models.QuerySet):
+    def add_sale(self, sale, sign=1):
+        # Add (sign=1) or take back (sign=-1) one sale's figures. Call it in
+        # the same transaction as the write to the Sale row.
+        self.add_sales([sale], sign)
+
+    def add_sales(self, sales, sign=1):
+        # Same as add_sale() for several sales, one update per rollup row
+        sales = list(sales)
+        groups = {}
+        for sale in sales:
+            key = (sale.date, sale.stock_item.category, sale.payment_method or "")
+            count, units, total_price, amount = groups.get(key, (0, 0, 0, 0))
+            groups[key] = (
+                count + sign,
+                units + sign * sale.quantity_sold,
+                total_price + sign * sale.total_price,
+                amount + sign * sale.amount,
+            )
+        self._apply(groups)
+        SalesAgentDailyRollup.objects.using(self.db).add_sales(sales, sign)
+        # Every sale write passes through here, bulk_create()s included
+        bump("sale", using=self.db)
+
+    def remove_sales(self, sales):
+        # Take a whole queryset of sales back out, e.g. before a cascade delete
+        for group in sales.rollup_groups():
+            self.filter(
+                day=group["date"],
+                category=group["stock_item__category"],
+                payment_method=group["payment_method"],
+            ).update(
+                sale_count=F("sale_count") - group["sale_count"],
+                units=F("units") - group["units"],
+                total_price=F("total_price") - group["total"],
+                amount=F("amount") - group["amount_total"],
+            )
+        self.filter(sale_count__lte=0).delete()
+        SalesAgentDailyRollup.objects.using(self.db).remove_sales(sales)
+        bump("sale", using=self.db)
+
+    def move_categories(self, moves):
+        # Move the sales of stock items whose category changed ({stock_id:
+        # old category}) to the rows of their new category. Rows are keyed
+        # on the item's current category, as rebuild() groups them; call it
+        # in the transaction that saved the new categories.
+        if not moves:
+            return
+        groups = {}
+        for group in (
+            Sale.objects.using(self.db)
+            .filter(stock_item__in=list(moves))
+            .with_amount()
+            .values("date", "stock_item", "stock_item__category", "payment_method")
+            .annotate(
+                sale_count=Count("id"),
+                units=Sum("quantity_sold"),
+                total=Sum("total_price"),
+                amount_total=Sum("amount_value"),
+            )
+            .order_by()
+        ):
+            figures = (group["sale_count"], group["units"], group["total"], group["amount_total"])
+            for category, sign in (
+                (moves[group["stock_item"]], -1),
+                (group["stock_item__category"], 1),
+            ):
+                key = (group["date"], category, group["payment_method"] or "")
+                groups[key] = tuple(
+                    total + sign * figure
+                    for total, figure in zip(groups.get(key, (0, 0, 0, 0)), figures)
+                )
+        self._apply(groups)
+        bump("sale", using=self.db)
+
+    def _apply(self, groups):
+        # Add signed (count, units, total_price, amount) deltas to their
+        # (day, category, payment_method) rows, dropping rows left empty
+        for (day, category, payment_method), figures in groups.items():
+            if not any(figures):
+                continue
+            count, units, total_price, amount = figures
+            row, _ = self.get_or_create(day=day, category=category, payment_method=payment_method)
+            self.filter(pk=row.pk).update(
+                sale_count=F("sale_count") + count,
+                units=F("units") + units,
+                total_price=F("total_price") + total_price,
+                amount=F("amount") + amount,
+            )
+            if count < 0:
+                self.filter(pk=row.pk, sale_count__lte=0).delete()
+
+    def rebuild(self):
+        # Recompute every row (and the per-agent rollup) from the Sale table
+        self.all().delete()
+        _fill_rollup(
+            self,
+            Sale.objects.using(self.db).rollup_groups(),
+            ("day", "category", "payment_method", "sale_count", "units", "total_price", "amount"),
+        )
+        SalesAgentDailyRollup.objects.using(self.db).rebuild()
+        bump("sale", using=self.db)
+
+
+def _fill_rollup(rollup, groups, fields):
+    # Insert a rollup's rows from `groups`, a values() queryset selecting
+    # its columns in the order of the rollup `fields`
+    connection = connections[rollup.db]
+    if connection.vendor == "postgresql":
+        # One INSERT ... SELECT, so the groups never leave the server
+        qn = connection.ops.quote_name
+        columns = ", ".join(qn(rollup.model._meta.get_field(name).column) for name in fields)
+        sql, params = groups.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {qn(rollup.model._meta.db_table)} ({columns}) {sql}", params)
+        return
+    attnames = [rollup.model._meta.get_field(name).attname for name in fields]
+    batch = []
+    for group in groups.iterator(chunk_size=2000):
+        batch.append(rollup.model(**dict(zip(attnames, group.values()))))
+        if len(batch) >= 2000:
+            rollup.bulk_create(batch)
+            batch = []
+    rollup.bulk_create(batch)
+
+
+class SalesDailyRollup(models.Model):
+    """Sales totals per day, stock category and payment method."""
+
+    day = models.DateField()
+    category = models.CharField(max_length=50)
+    payment_method = models.CharField(max_length=50, blank=True)
+    sale_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    total_price = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+
+    objects = SalesDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "category", "payment_method"], name="sales_rollup_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category} {self.payment_method}: {self.sale_count} sales"
+
+
+class SalesAgentDailyRollupQuerySet(models.QuerySet):
+    # Kept in step by SalesDailyRollupQuerySet, which every sale write goes through
+
+    def add_sales(self, sales, sign=1):
+        # Add (sign=1) or take back (sign=-1) the sales' figures, one update per row
+        groups = {}
+        for sale in sales:
+            key = (sale.date, sale.sales_agent_id)
+            count, units, total_price, amount = groups.get(key, (0, 0, 0, 0))
+            groups[key] = (
+                count + 1,
+                units + sale.quantity_sold,
+                total_price + sale.total_price,
+                amount + sale.amount,
+            )
+        for (day, agent_id), (count, units, total_price, amount) in groups.items():
+            row, _ = self.get_or_create(day=day, sales_agent_id=agent_id)
+            self.filter(pk=row.pk).update(
+                sale_count=F("sale_count") + sign * count,
+                units=F("units") + sign * units,
+                total_price=F("total_price") + sign * total_price,
+                amount=F("amount") + sign * amount,
+            )
+            if sign < 0:
+                self.filter(pk=row.pk, sale_count__lte=0).delete()
+
+    def remove_sales(self, sales):
+        # Take a whole queryset of sales back out, e.g. before a cascade delete
+        for group in sales.agent_rollup_groups():
+            self.filter(day=group["date"], sales_agent=group["sales_agent"]).update(
+                sale_count=F("sale_count") - group["sale_count"],
+                units=F("units") - group["units"],
+                total_price=F("total_price") - group["total"],
+                amount=F("amount") - group["amount_total"],
+            )
+        self.filter(sale_count__lte=0).delete()
+
+    def rebuild(self):
+        # Recompute every row from the Sale table
+        self.all().delete()
+        _fill_rollup(
+            self,
+            Sale.objects.using(self.db).agent_rollup_groups(),
+            ("day", "sales_agent", "sale_count", "units", "total_price", "amount"),
+        )
+
+
+class SalesAgentDailyRollup(models.Model):
+    """Sales totals per day and sales agent."""
+
+    day = models.DateField()
+    sales_agent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    sale_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    total_price = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+
+    objects = SalesAgentDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "sales_agent"], name="sales_agent_rollup_key"),
+        ]
+        indexes = [
+            # one agent's daily trend
+            models.Index(fields=["sales_agent", "day"], name="sales_agent_rollup_agent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.sales_agent_id}: {self.sale_count} sales"
+
+
+class StockCategoryTotalQuerySet(models.QuerySet):
+    def valuation(self):
+        # Current stock value across all categories: a SUM over one row per category
+        return self.aggregate(total=Sum("value"))["total"] or 0
+
+    def rebuild(self):
+        # Recompute every category from the Stock table
+        self.all().delete()
+        self.bulk_create(
+            self.model(category=row["category"], quantity=row["quantity"], value=row["value"])
+            for row in Stock.objects.using(self.db)
+            .with_value()
+            .values("category")
+            .annotate(quantity=Sum("quantity"), value=Sum("value"))
+            .order_by()
+        )
+        bump("stock", using=self.db)
+
+
+class StockCategoryTotal(models.Model):
+    """Running stock quantity and value (at selling price) per category."""
+
+    category = models.CharField(max_length=50, unique=True)
+    quantity = models.IntegerField(default=0)
+    value = models.DecimalField(max_digits=20, decimal_places=0, default=0)
+
+    objects = StockCategoryTotalQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.category}: {self.quantity} units"
+
+
+class StockForecastQuerySet(models.QuerySet):
+    def reorder_needed(self):
+        # Items selling at or below their reorder point, the shortest cover
+        # (at the current quantity) first
+        return (
+            self.select_related("stock")
+            .filter(daily_demand__gt=0, stock__quantity__lte=F("reorder_point"))
+            .annotate(cover=Cast(F("stock__quantity"), models.FloatField()) / F("daily_demand"))
+            .order_by("cover", "stock__name")
+        )
+
+
+class StockForecast(models.Model):
+    """
+    Forecast demand and reorder point per stock item, written by the
+    forecast_demand command (see mwfapp/forecasting.py).
+    """
+
+    stock = models.OneToOneField(Stock, on_delete=models.CASCADE, primary_key=True, related_name="forecast")
+    # Units a day, and the spread of the daily forecast error
+    daily_demand = models.FloatField()
+    demand_std = models.FloatField()
+    # Exponential smoothing factor fitted for the item
+    smoothing = models.FloatField()
+    reorder_point = models.IntegerField()
+    # Days the quantity at the time of the forecast lasts; null without demand
+    days_of_cover = models.FloatField(null=True)
+    suggested_order = models.IntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    objects = StockForecastQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.stock}: {self.daily_demand:.2f}/day, reorder at {self.reorder_point}"
+
+
+class StockMovementQuerySet(models.QuerySet):
+    def changes(self, stock, old_quantity, old_price, old_category, kind="ADJUSTMENT"):
+        # Unsaved movements taking `stock` from its old quantity, selling
+        # price and category to its current ones; a category change moves
+        # the whole item out of one category and into the other
+        old_value = old_quantity * Decimal(old_price)
+        new_value = stock.quantity * Decimal(stock.selling_price)
+        if stock.category != old_category:
+            return [
+                self.model(stock=stock, category=old_category, kind=kind,
+                           quantity=-old_quantity, value=-old_value),
+                self.model(stock=stock, category=stock.category, kind=kind,
+                           quantity=stock.quantity, value=new_value),
+            ]
+        if stock.quantity == old_quantity and new_value == old_value:
+            return []
+        return [
+            self.model(stock=stock, category=stock.category, kind=kind,
+                       quantity=stock.quantity - old_quantity, value=new_value - old_value)
+        ]
+
+    def record(self, stock, kind, quantity, sale=None):
+        # Append one movement of `quantity` units (negative for stock going
+        # out), valued at the stock's selling price
+        return self.record_many([self.model(stock=stock, kind=kind, quantity=quantity, sale=sale)])
+
+    def record_many(self, movements):
+        # Save unsaved movements and bring the category totals up to date.
+        # Call it in the transaction that changed Stock.quantity, after the
+        # change: the balances are read back from the updated rows, which
+        # that write keeps locked until commit.
+        movements = list(movements)
+        if not movements:
+            return movements
+        deltas = {}
+        for movement in movements:
+            if not movement.category:
+                movement.category = movement.stock.category
+            if movement.value is None:
+                movement.value = movement.quantity * Decimal(movement.stock.selling_price)
+            quantity, value = deltas.get(movement.category, (0, 0))
+            deltas[movement.category] = (quantity + movement.quantity, value + movement.value)
+
+        totals = StockCategoryTotal.objects.using(self.db)
+        for category, (quantity, value) in deltas.items():
+            row, _ = totals.get_or_create(category=category)
+            totals.filter(pk=row.pk).update(
+                quantity=F("quantity") + quantity, value=F("value") + value
+            )
+        categories = {
+            row[0]: list(row[1:])
+            for row in totals.filter(category__in=list(deltas)).values_list(
+                "category", "quantity", "value"
+            )
+        }
+        balances = dict(
+            Stock.objects.using(self.db)
+            .filter(pk__in={m.stock_id for m in movements})
+            .values_list("pk", "quantity")
+        )
+
+        # The rows now hold the totals after the last movement; walk back to
+        # the balance after each one
+        for movement in reversed(movements):
+            movement.stock_balance = balances.get(movement.stock_id, 0)
+            balances[movement.stock_id] = movement.stock_balance - movement.quantity
+            total = categories[movement.category]
+            movement.category_balance, movement.category_value = total
+            total[0] -= movement.quantity
+            total[1] -= movement.value
+        # Every quantity change is recorded here, update()s included
+        bump("stock", using=self.db)
+        return self.bulk_create(movements)
+
+    def level_at(self, stock, when):
+        # Quantity of `stock` at `when`: the balance after its last movement by then
+        movement = (
+            self.filter(stock=stock, created_at__lte=when)
+            .order_by("-created_at", "-id")
+            .only("stock_balance")
+            .first()
+        )
+        return movement.stock_balance if movement else 0
+
+    def category_levels_at(self, when):
+        # {category: (quantity, value)} at `when`, one index lookup per category
+        levels = {}
+        for category in StockCategoryTotal.objects.using(self.db).values_list("category", flat=True):
+            movement = (
+                self.filter(category=category, created_at__lte=when)
+                .order_by("-created_at", "-id")
+                .only("category_balance", "category_value")
+                .first()
+            )
+            if movement:
+                levels[category] = (movement.category_balance, movement.category_value)
+        return levels
+
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger: one row per change to a stock item's quantity
+    (or value), with the running balances after it.
+    """
+
+    KIND_CHOICES = [
+        ('OPENING', 'Opening balance'),
+        ('RECEIPT', 'Receipt'),
+        ('SALE', 'Sale'),
+        ('REVERSAL', 'Sale edit reversal'),
+        ('DELETION', 'Sale deletion'),
+        ('ADJUSTMENT', 'Adjustment'),
+        ('WRITE_OFF', 'Stock item removed'),
+    ]
+
+    # Kept (with a NULL stock/sale) when the item or sale is deleted
+    stock = models.ForeignKey(Stock, on_delete=models.SET_NULL, null=True, related_name="movements")
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name="movements")
+    category = models.CharField(max_length=50)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    value = models.DecimalField(max_digits=20, decimal_places=0)
+    stock_balance = models.IntegerField()
+    category_balance = models.IntegerField()
+    category_value = models.DecimalField(max_digits=20, decimal_places=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = StockMovementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # level_at / stock history and the reconcile SUM per stock
+            models.Index(fields=["stock", "created_at"], name="movement_stock_time_idx"),
+            # category_levels_at
+            models.Index(fields=["category", "created_at"], name="movement_category_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} ({self.category})"
@@ -0,0 +1,186 @@
+"""
+Keyset (cursor) pagination for the sales and stock lists.
+
+Paginator issues COUNT(*) plus an OFFSET query, so deep pages get slower as
+the tables grow. CursorPaginator instead seeks past the last row shown using
+the ordering columns, which the (date, id) and (name, id) indexes answer
+directly. CursorPage keeps the parts of the Page interface the templates use.
+Rows may be model instances or `.values()` dicts that include the ordering
+fields.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate `queryset` by `ordering`, e.g. ("-date", "-id").
+
+    The last ordering field must be unique (the primary key) so every row
+    has a distinct position. With approximate_count=True, `count` is a cheap
+    estimate of the table size for unfiltered querysets (None otherwise, or
+    when the table has no statistics yet).
+    """
+
+    def __init__(self, queryset, ordering, per_page=10, approximate_count=False):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.per_page = per_page
+        self.approximate_count = approximate_count
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip("-")) for name in ordering
+        ]
+
+    def get_page(self, cursor=None):
+        """Return the page after/before `cursor`; the first page if invalid."""
+        direction, values = self._decode(cursor)
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse=direction == "prev"))
+        if direction == "prev":
+            queryset = queryset.reverse()
+
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if direction == "prev":
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows, self, None, None)
+        if direction == "prev":
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return CursorPage(
+            rows,
+            self,
+            self._encode("next", rows[-1]) if has_next else None,
+            self._encode("prev", rows[0]) if has_previous else None,
+        )
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count or self.queryset.query.where:
+            return None
+        return approximate_row_count(self.queryset.model)
+
+    def _seek(self, values, reverse=False):
+        # (a, b) after (x, y) in the list order: a > x OR (a = x AND b > y),
+        # with each comparison flipped for descending fields
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            term = Q(**{f"{name.lstrip('-')}__{lookup}": values[i]})
+            for prior, value in zip(self.ordering[:i], values[:i]):
+                term &= Q(**{prior.lstrip("-"): value})
+            condition |= term
+        return condition
+
+    def _encode(self, direction, obj):
+        values = [
+            obj[field.attname] if isinstance(obj, dict) else field.value_from_object(obj)
+            for field in self.fields
+        ]
+        raw = json.dumps([direction, values], cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def _decode(self, cursor):
+        if not cursor:
+            return "next", None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+            if direction not in ("next", "prev") or len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return direction, [
+                field.to_python(value) for field, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            # Bad base64 or JSON (both ValueErrors), wrong shape, or values
+            # the ordering fields reject
+            return "next", None
+
+
+def approximate_row_count(model):
+    """
+    Estimate the number of rows in the model's table without COUNT(*).
+
+    Reads the planner statistics: pg_class on PostgreSQL, sqlite_stat1 on
+    SQLite. Both are as of the last ANALYZE (or autovacuum), so the figure
+    is approximate; None if the table has not been analysed.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    try:
+        if connection.vendor == "postgresql":
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+                row = cursor.fetchone()
+        elif connection.vendor == "sqlite":
+            # The stat column starts with the row count of the table (idx is
+            # NULL) or of each of its indexes, which is the same number
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT CAST(stat AS integer) FROM sqlite_stat1 WHERE tbl = %s "
+                    "ORDER BY idx IS NOT NULL LIMIT 1",
+                    [table],
+                )
+                row = cursor.fetchone()
+        else:
+            return None
+    except DatabaseError:
+        # No sqlite_stat1 table before the first ANALYZE
+        return None
+    if row and row[0] >= 0:
+        return row[0]
+    return None
+
+
+def analyze(connection):
+    """
+    Refresh the statistics approximate_row_count() reads. Run after migrate
+    and by the nightly forecast_demand: nothing else analyses a SQLite
+    database, while on PostgreSQL autovacuum also does it.
+    """
+    if connection.vendor in ("postgresql", "sqlite"):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+def analyze_after_migrate(using, **kwargs):
+    """post_migrate receiver, connected in MwfappConfig.ready()."""
+    analyze(connections[using])
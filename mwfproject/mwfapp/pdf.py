@@ -0,0 +1,75 @@
+"""
+HTML to PDF rendering with WeasyPrint.
+
+Parsing the stylesheet and building the font configuration cost more than
+laying out a one-page receipt, so both are done once per process and
+reused for every render. This module imports nothing from Django, so
+process-pool workers can load it without setting Django up.
+"""
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+
+class PDFUnavailable(Exception):
+    """WeasyPrint or the system libraries it needs (Pango) are missing."""
+
+
+def _import_weasyprint():
+    # WeasyPrint prints an installation banner to stdout when Pango is
+    # missing; the exception carries the same information
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import weasyprint
+            from weasyprint.text.fonts import FontConfiguration
+    except (ImportError, OSError) as exc:
+        raise PDFUnavailable(f"PDF rendering needs WeasyPrint and Pango ({exc})") from exc
+    return weasyprint, FontConfiguration
+
+
+def available():
+    """True if WeasyPrint and its system libraries can be loaded."""
+    try:
+        _import_weasyprint()
+    except PDFUnavailable:
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def _renderer(stylesheet):
+    weasyprint, FontConfiguration = _import_weasyprint()
+    HTML, CSS = weasyprint.HTML, weasyprint.CSS
+    font_config = FontConfiguration()
+    return HTML, CSS(filename=stylesheet, font_config=font_config), font_config
+
+
+def html_to_pdf(html, stylesheet):
+    """Render an HTML string to PDF bytes with the (cached) `stylesheet` file."""
+    HTML, css, font_config = _renderer(stylesheet)
+    return HTML(string=html).write_pdf(stylesheets=[css], font_config=font_config)
+
+
+def html_to_pdf_many(documents, stylesheet, workers=None):
+    """
+    Render several HTML strings, in a process pool when there is more than one.
+
+    Each worker parses the stylesheet once, in its initializer, and then
+    renders its share of the documents.
+    """
+    # Fail here, not inside a worker, if WeasyPrint cannot load
+    _renderer(stylesheet)
+    workers = min(workers or os.cpu_count() or 1, len(documents))
+    if workers < 2:
+        return [html_to_pdf(html, stylesheet) for html in documents]
+    with ProcessPoolExecutor(workers, initializer=_renderer, initargs=(stylesheet,)) as pool:
+        return list(
+            pool.map(
+                html_to_pdf,
+                documents,
+                [stylesheet] * len(documents),
+                chunksize=max(1, len(documents) // (workers * 4)),
+            )
+        )
@@ -0,0 +1,254 @@
+"""
+Opt-in request profiling (DJANGO_PROFILING=1 adds ProfilingMiddleware).
+
+For every request it records the view, wall time, SQL query count and
+time, repeated queries and template render time. Queries are seen
+through an execute wrapper on every database connection, and render
+time through the Django template backend. Both report to the profile
+of the request in progress, found through a context variable, so
+queries run by run_queries()'s worker threads count too.
+
+The results go three ways:
+- a Server-Timing header on the response, for the browser's dev tools;
+- a JSON line in the slow-request log (the "mwfapp.slow_requests"
+  logger) when the request took PROFILING_SLOW_MS or longer;
+- per-view totals for `/metrics`, in Prometheus' text format.
+
+Each worker process keeps its totals in memory and copies them to the
+cache every FLUSH_INTERVAL seconds, so `/metrics` can add up all the
+workers' totals whichever worker answers the scrape.
+"""
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template
+
+logger = logging.getLogger("mwfapp.slow_requests")
+
+# Upper bounds, in seconds, of the request duration histogram
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_INTERVAL = 10
+SNAPSHOT_TIMEOUT = 7 * 24 * 60 * 60
+WORKERS_KEY = "metrics:workers"
+
+_current = ContextVar("mwfapp_profile", default=None)
+_installed = False
+_lock = threading.Lock()
+_totals = {}
+_last_flush = 0.0
+
+
+class Profile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = []  # (sql, params, seconds); appended from any thread
+        self.renders = []  # seconds per top-level template render
+
+    def add_query(self, sql, params, seconds):
+        self.queries.append((sql, repr(params), seconds))
+
+    def summary(self, request, response):
+        match = request.resolver_match
+        statements = Counter(sql for sql, _, _ in self.queries)
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        repeated_sql, repeats = statements.most_common(1)[0] if statements else ("", 0)
+        return {
+            "view": match.view_name if match else "<unresolved>",
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "seconds": time.perf_counter() - self.start,
+            "sql_queries": len(self.queries),
+            "sql_seconds": sum(seconds for _, _, seconds in self.queries),
+            # The same statement with different parameters: N+1 lookups
+            "similar_queries": len(self.queries) - len(statements),
+            # The same statement with the same parameters
+            "duplicate_queries": len(self.queries) - len(exact),
+            "most_repeated_sql": repeated_sql if repeats > 1 else "",
+            "render_seconds": sum(self.renders),
+        }
+
+
+def _record_sql(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, params, time.perf_counter() - start)
+
+
+def _wrap_connection(connection, **kwargs):
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_sql)
+
+
+def _wrap_thread_connections(**kwargs):
+    # Connections opened before install() (or kept by CONN_MAX_AGE) on
+    # the thread starting this request
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+
+
+_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    profile = _current.get()
+    if profile is None:
+        return _render(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        profile.renders.append(time.perf_counter() - start)
+
+
+def install():
+    """Hook the database connections and template rendering up; idempotent."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_wrap_connection, dispatch_uid="mwfapp-profiling")
+    request_started.connect(_wrap_thread_connections, dispatch_uid="mwfapp-profiling")
+    _wrap_thread_connections()
+    Template.render = _timed_render
+
+
+def start():
+    """Begin profiling the current request; returns the token for finish()."""
+    return _current.set(Profile())
+
+
+def finish(token, request, response):
+    """Stop profiling: header, slow log and totals. Returns the summary."""
+    profile = _current.get()
+    _current.reset(token)
+    summary = profile.summary(request, response)
+
+    response["Server-Timing"] = ", ".join([
+        f"total;dur={summary['seconds'] * 1000:.1f}",
+        f'sql;dur={summary["sql_seconds"] * 1000:.1f};desc="{summary["sql_queries"]} queries, '
+        f'{summary["similar_queries"]} repeated"',
+        f"render;dur={summary['render_seconds'] * 1000:.1f}",
+    ])
+    slow = summary["seconds"] * 1000 >= settings.PROFILING_SLOW_MS
+    if slow:
+        logger.warning(json.dumps({"time": time.time(), **summary}))
+    _add_to_totals(summary, slow)
+    return summary
+
+
+def _add_to_totals(summary, slow):
+    global _last_flush
+    with _lock:
+        totals = _totals.setdefault(summary["view"], {
+            "requests": 0, "errors": 0, "slow": 0, "seconds": 0.0, "sql_queries": 0,
+            "sql_seconds": 0.0, "similar_queries": 0, "render_seconds": 0.0,
+            "buckets": [0] * len(BUCKETS),
+        })
+        totals["requests"] += 1
+        totals["errors"] += summary["status"] >= 500
+        totals["slow"] += slow
+        for name in ("seconds", "sql_queries", "sql_seconds", "similar_queries", "render_seconds"):
+            totals[name] += summary[name]
+        for i, bound in enumerate(BUCKETS):
+            if summary["seconds"] <= bound:
+                totals["buckets"][i] += 1
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+        if due:
+            _last_flush = time.monotonic()
+    if due:
+        flush()
+
+
+def flush():
+    """Copy this process's totals to the cache, where /metrics reads them."""
+    with _lock:
+        snapshot = json.loads(json.dumps(_totals))
+    key = f"metrics:worker:{os.getpid()}"
+    cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    workers = cache.get(WORKERS_KEY, [])
+    if key not in workers:
+        cache.set(WORKERS_KEY, [*workers, key], SNAPSHOT_TIMEOUT)
+
+
+def collect():
+    """Every worker's totals, added up per view."""
+    flush()
+    combined = {}
+    for snapshot in cache.get_many(cache.get(WORKERS_KEY, [])).values():
+        for view, totals in snapshot.items():
+            if view not in combined:
+                combined[view] = totals
+                continue
+            into = combined[view]
+            for name, value in totals.items():
+                if name == "buckets":
+                    into[name] = [a + b for a, b in zip(into[name], value)]
+                else:
+                    into[name] += value
+    return combined
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(combined):
+    counters = [
+        ("requests", "mwf_requests_total", "Requests handled."),
+        ("errors", "mwf_request_errors_total", "Requests answered with a 5xx status."),
+        ("slow", "mwf_slow_requests_total", "Requests at or over PROFILING_SLOW_MS."),
+        ("sql_queries", "mwf_sql_queries_total", "SQL queries run."),
+        ("sql_seconds", "mwf_sql_seconds_total", "Time spent in SQL queries."),
+        ("similar_queries", "mwf_repeated_sql_queries_total", "Queries repeating an earlier statement of the same request."),
+        ("render_seconds", "mwf_template_render_seconds_total", "Time spent rendering templates."),
+    ]
+    lines = []
+    for name, metric, help_text in counters:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for view, totals in sorted(combined.items()):
+            lines.append(f'{metric}{{view="{_escape(view)}"}} {totals[name]}')
+
+    metric = "mwf_request_duration_seconds"
+    lines += [f"# HELP {metric} Request wall time.", f"# TYPE {metric} histogram"]
+    for view, totals in sorted(combined.items()):
+        label = f'view="{_escape(view)}"'
+        for bound, count in zip(BUCKETS, totals["buckets"]):
+            lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {totals["requests"]}')
+        lines.append(f"{metric}_sum{{{label}}} {totals['seconds']}")
+        lines.append(f"{metric}_count{{{label}}} {totals['requests']}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics(request):
+    """
+    Per-view request totals in Prometheus' text format.
+    - Open to managers, or to scrapers sending `Authorization: Bearer
+      <METRICS_TOKEN>` when that setting is non-empty.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    scraper = bool(token) and hmac.compare_digest(authorization, f"Bearer {token}")
+    if not scraper and getattr(request.user, "role", None) != "MANAGER":
+        return HttpResponseForbidden("Managers only.")
+    return HttpResponse(
+        render_metrics(collect()), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
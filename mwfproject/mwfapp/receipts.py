@@ -0,0 +1,96 @@
+"""
+Receipt data and server-side PDF receipts.
+
+A receipt covers one sale, or every line of the sale's order. Generated
+PDFs are cached under a hash of the receipt's HTML: rendering the template
+costs little next to the PDF, and any change that shows on the receipt
+(an edited or deleted line, a renamed item or agent) gives a fresh key.
+"""
+import hashlib
+
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Sale
+from .pdf import html_to_pdf, html_to_pdf_many
+
+STYLESHEET = "css/receipt.css"
+CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def receipt_lines(sale):
+    """The sales printed on `sale`'s receipt, with `unit_price` set."""
+    if sale.order_id:
+        lines = list(Sale.objects.with_related().filter(order_id=sale.order_id).order_by("id"))
+    else:
+        lines = [sale]
+    for line in lines:
+        line.unit_price = line.sale_price / line.quantity_sold
+    return lines
+
+
+def receipt_context(lines):
+    return {
+        "sale": lines[0],
+        "lines": lines,
+        "unit_price": lines[0].unit_price,
+        "transport_total": sum(line.transport for line in lines),
+        "total_paid": sum(line.total_price for line in lines),
+    }
+
+
+def receipt_filename(lines):
+    if lines[0].order_id:
+        return f"order-{lines[0].order_id:04d}.pdf"
+    return f"receipt-{lines[0].id:04d}.pdf"
+
+
+def _html(lines):
+    return render_to_string("receipt.html", {**receipt_context(lines), "pdf": True})
+
+
+def _cache_key(html):
+    return f"receipt-pdf:{hashlib.sha256(html.encode()).hexdigest()}"
+
+
+def _stylesheet():
+    return finders.find(STYLESHEET)
+
+
+def receipt_pdf(lines):
+    """PDF bytes for the receipt of `lines`, from the cache when unchanged."""
+    html = _html(lines)
+    key = _cache_key(html)
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = html_to_pdf(html, _stylesheet())
+        cache.set(key, pdf, CACHE_TIMEOUT)
+    return pdf
+
+
+def day_receipts(day, workers=None):
+    """
+    [(filename, pdf bytes)] for every receipt of `day`.
+
+    Cached receipts are fetched in one call; the rest are rendered in a
+    process pool and cached.
+    """
+    receipts = {}
+    for sale in Sale.objects.with_related().filter(date=day).order_by("id"):
+        receipts.setdefault(sale.order_id or f"sale-{sale.id}", []).append(sale)
+    receipts = list(receipts.values())
+    for lines in receipts:
+        for line in lines:
+            line.unit_price = line.sale_price / line.quantity_sold
+
+    htmls = [_html(lines) for lines in receipts]
+    keys = [_cache_key(html) for html in htmls]
+    pdfs = cache.get_many(keys)
+    missing = [i for i, key in enumerate(keys) if key not in pdfs]
+    if missing:
+        rendered = html_to_pdf_many([htmls[i] for i in missing], _stylesheet(), workers=workers)
+        new = {keys[i]: pdf for i, pdf in zip(missing, rendered)}
+        cache.set_many(new, CACHE_TIMEOUT)
+        pdfs.update(new)
+    return [(receipt_filename(lines), pdfs[key]) for lines, key in zip(receipts, keys)]
@@ -0,0 +1,125 @@
+"""
+Sales per agent and per payment method, from the daily rollups.
+
+Each figure is one grouped query over SalesAgentDailyRollup (a row per
+day and agent) or SalesDailyRollup (a row per day, category and payment
+method), never over the Sale table, so a report's cost follows the days
+and agents in its date range rather than the number of sales. Revenue is
+total_price (transport included), as on the dashboard; the average ticket
+is revenue per sale.
+"""
+from datetime import timedelta
+
+from django.db.models import Sum
+
+from .asyncdb import run_queries
+from .models import SalesAgentDailyRollup, SalesDailyRollup, User
+
+# Agents drawn on the daily trend chart, by revenue
+TREND_AGENTS = 5
+# Longest date range a report covers, in days
+MAX_DAYS = 366
+
+
+def _totals(rows, key, name):
+    # Add the average ticket to grouped rows and turn Decimals into ints;
+    # "key" is the grouped value (agent id or payment method)
+    return [
+        {
+            "key": row[key],
+            "name": name(row),
+            "sales": row["sales"],
+            "units": row["units"],
+            "revenue": int(row["revenue"]),
+            "average_ticket": round(row["revenue"] / row["sales"]) if row["sales"] else 0,
+        }
+        for row in rows
+    ]
+
+
+def _agent_names():
+    # {user id: display name}; users are few next to the rollup rows, and
+    # leaving them out of the GROUP BY keeps the leaderboard query cheap
+    return {
+        user_id: f"{first_name} {last_name}".strip() or username
+        for user_id, username, first_name, last_name in User.objects.values_list(
+            "id", "username", "first_name", "last_name"
+        )
+    }
+
+
+def _payment_name(row):
+    return row["payment_method"] or "Unspecified"
+
+
+def agent_rows(start, end):
+    """Per-agent totals for `start`..`end`, highest revenue first."""
+    return (
+        SalesAgentDailyRollup.objects.filter(day__gte=start, day__lte=end)
+        .values("sales_agent")
+        .annotate(sales=Sum("sale_count"), units=Sum("units"), revenue=Sum("total_price"))
+        .order_by("-revenue", "sales_agent")
+    )
+
+
+def payment_rows(start, end):
+    """Per-payment-method totals for `start`..`end`, highest revenue first."""
+    return (
+        SalesDailyRollup.objects.filter(day__gte=start, day__lte=end)
+        .values("payment_method")
+        .annotate(sales=Sum("sale_count"), units=Sum("units"), revenue=Sum("total_price"))
+        .order_by("-revenue", "payment_method")
+    )
+
+
+def _trend(totals, rows, key, start, end):
+    # Revenue per day from start to end for each of `totals` (in its order)
+    # with any sales in `rows`, grouped (day, key, revenue) rows
+    series = {}
+    for row in rows:
+        values = series.setdefault(row[key], [0] * ((end - start).days + 1))
+        values[(row["day"] - start).days] = int(row["revenue"])
+    return [
+        {"name": total["name"], "revenue": series[total["key"]]}
+        for total in totals
+        if total["key"] in series
+    ]
+
+
+def agent_and_payment_report(start, end, agent=None):
+    """
+    The agents report for `start`..`end`: the agent leaderboard, payment
+    method totals, and revenue per day for the top agents (or just
+    `agent`, an id) and for each payment method. The first four queries
+    go through run_queries(), then the top agents' days are read by index.
+    """
+    payment_days = (
+        SalesDailyRollup.objects.filter(day__gte=start, day__lte=end)
+        .values("day", "payment_method")
+        .annotate(revenue=Sum("total_price"))
+        .order_by()
+    )
+    agents, names, payments, payment_days = run_queries(
+        lambda: list(agent_rows(start, end)),
+        _agent_names,
+        lambda: _totals(payment_rows(start, end), "payment_method", _payment_name),
+        lambda: list(payment_days),
+    )
+    agents = _totals(agents, "sales_agent", lambda row: names.get(row["sales_agent"], ""))
+
+    trend_agents = [agent] if agent else [row["key"] for row in agents[:TREND_AGENTS]]
+    agent_days = (
+        SalesAgentDailyRollup.objects.filter(sales_agent__in=trend_agents, day__gte=start, day__lte=end)
+        .values("day", "sales_agent")
+        .annotate(revenue=Sum("total_price"))
+        .order_by()
+    )
+    agent_days = list(agent_days)
+
+    return {
+        "agents": agents,
+        "payments": payments,
+        "days": [str(start + timedelta(days=i)) for i in range((end - start).days + 1)],
+        "agent_trend": _trend(agents, agent_days, "sales_agent", start, end),
+        "payment_trend": _trend(payments, payment_days, "payment_method", start, end),
+    }
@@ -0,0 +1,237 @@
+"""
+Server-side search for the sales, stock and user lists.
+
+On SQLite each searchable table gets an external-content FTS5 index that
+triggers keep in sync with the table. On PostgreSQL every word must appear
+somewhere in the searched columns, which GIN trigram indexes (pg_trgm)
+serve. Other backends (or SQLite builds without FTS5) fall back to
+unindexed prefix LIKE lookups.
+
+The sale forms' stock picker matches name and category prefixes as
+ranges of UPPER(column), which the UPPER() indexes on Stock serve on
+every backend.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import DatabaseError, OperationalError, connections, router, transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.db.models.expressions import RawSQL
+
+from .models import Sale, Stock, User
+
+# Columns indexed for full-text search, per model
+FTS_FIELDS = {
+    Stock: ["name", "type", "category", "supplier"],
+    Sale: ["customer_name"],
+    User: ["username", "first_name", "last_name", "email"],
+}
+
+_fts_ready = set()
+
+
+def _fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def install_fts(connection):
+    """
+    Create the FTS5 tables and their sync triggers if any are missing.
+
+    Runs after every migrate because SQLite table rebuilds (e.g. adding a
+    NOT NULL column) drop the triggers of the rebuilt table.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for model, fields in FTS_FIELDS.items():
+            table = model._meta.db_table
+            fts = _fts_table(model)
+            triggers = {f"{fts}_ai", f"{fts}_ad", f"{fts}_au"}
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+                [fts, *sorted(triggers)],
+            )
+            if len(cursor.fetchall()) == len(triggers) + 1:
+                continue
+
+            columns = ", ".join(fields)
+            new_values = ", ".join(f"new.{f}" for f in fields)
+            old_values = ", ".join(f"old.{f}" for f in fields)
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{columns}, content='{table}', content_rowid='id')"
+                )
+            except OperationalError:
+                # SQLite compiled without FTS5: searches use the LIKE fallback
+                return
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {columns}) "
+                f"VALUES ('delete', old.id, {old_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {columns}) "
+                f"VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def install_trigram_indexes(connection):
+    """
+    Create GIN trigram indexes for the icontains searches on PostgreSQL.
+
+    The indexed expression is UPPER(column), which is what icontains
+    compares. Without the pg_trgm extension (it could not be created)
+    searches still work, by scanning.
+    """
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        return
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model, fields in FTS_FIELDS.items():
+            table = model._meta.db_table
+            for field in fields:
+                column = model._meta.get_field(field).column
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_{column}_trgm')} ON {qn(table)} "
+                    f"USING gin ((UPPER({qn(column)}::text)) gin_trgm_ops)"
+                )
+
+
+def install_search_after_migrate(sender, using, **kwargs):
+    """post_migrate receiver, connected in MwfappConfig.ready()."""
+    install_fts(connections[using])
+    install_trigram_indexes(connections[using])
+
+
+def _use_fts(model):
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor != "sqlite":
+        return False
+    key = (connection.alias, str(connection.settings_dict["NAME"]))
+    if key not in _fts_ready:
+        if _fts_table(model) not in connection.introspection.table_names():
+            return False
+        _fts_ready.add(key)
+    return True
+
+
+def _use_trigram(model):
+    return connections[router.db_for_read(model)].vendor == "postgresql"
+
+
+def _contains_words(query, lookups):
+    # Every word must appear in one of the fields: 'ami kamp' -> ami AND kamp
+    condition = Q()
+    for word in query.split():
+        condition &= reduce(or_, (Q(**{f"{lookup}__icontains": word}) for lookup in lookups))
+    return condition
+
+
+def _fts_match(model, query):
+    # Every word must match as a prefix: 'ami kamp' -> "ami"* "kamp"*
+    terms = " ".join('"%s"*' % word.replace('"', '""') for word in query.split())
+    fts = _fts_table(model)
+    return RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", (terms,))
+
+
+def search_stocks(queryset, query):
+    """Filter stock by name, type, category or supplier."""
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    if _use_fts(Stock):
+        return queryset.filter(pk__in=_fts_match(Stock, query))
+    if _use_trigram(Stock):
+        return queryset.filter(_contains_words(query, FTS_FIELDS[Stock]))
+    return queryset.filter(
+        Q(name__istartswith=query)
+        | Q(type__istartswith=query)
+        | Q(category__istartswith=query)
+        | Q(supplier__istartswith=query)
+    )
+
+
+def search_sales(queryset, query):
+    """Filter sales by customer, product (name, category, supplier) or agent."""
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    if _use_fts(Sale):
+        return queryset.filter(
+            Q(pk__in=_fts_match(Sale, query))
+            | Q(stock_item__in=_fts_match(Stock, query))
+            | Q(sales_agent__in=_fts_match(User, query))
+        )
+    if _use_trigram(Sale):
+        return queryset.filter(
+            _contains_words(
+                query,
+                FTS_FIELDS[Sale]
+                + [f"stock_item__{field}" for field in FTS_FIELDS[Stock]]
+                + [f"sales_agent__{field}" for field in FTS_FIELDS[User]],
+            )
+        )
+    return queryset.filter(
+        Q(customer_name__istartswith=query)
+        | Q(stock_item__name__istartswith=query)
+        | Q(stock_item__category__istartswith=query)
+        | Q(stock_item__supplier__istartswith=query)
+        | Q(sales_agent__email__istartswith=query)
+    )
+
+
+def search_users(queryset, query):
+    """Filter users by username, first/last name or email."""
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    if _use_fts(User):
+        return queryset.filter(pk__in=_fts_match(User, query))
+    if _use_trigram(User):
+        return queryset.filter(_contains_words(query, FTS_FIELDS[User]))
+    return queryset.filter(
+        Q(username__istartswith=query)
+        | Q(first_name__istartswith=query)
+        | Q(last_name__istartswith=query)
+        | Q(email__istartswith=query)
+    )
+
+
+def _prefix_range(lookup, prefix):
+    # PREFIX <= UPPER(column) < the string just after every PREFIX...
+    upper = prefix.upper()
+    following = upper[:-1] + chr(min(ord(upper[-1]) + 1, 0x10FFFF))
+    return Q(**{f"{lookup}__gte": upper, f"{lookup}__lt": following})
+
+
+def suggest_stocks(query, limit):
+    """In-stock items whose name or category starts with `query`, by name."""
+    query = (query or "").strip()
+    if not query:
+        return Stock.objects.none()
+    # The ranges use the indexes; istartswith keeps the exact meaning where
+    # the database's collation or UPPER() differs from Python's
+    return (
+        Stock.objects.annotate(name_key=Upper("name"), category_key=Upper("category"))
+        .filter(
+            (_prefix_range("name_key", query) & Q(name__istartswith=query))
+            | (_prefix_range("category_key", query) & Q(category__istartswith=query)),
+            quantity__gt=0,
+        )
+        .order_by("name_key", "id")[:limit]
+    )
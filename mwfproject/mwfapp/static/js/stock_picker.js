@@ -0,0 +1,133 @@
+// Stock picker for the sale forms: type a product name or category and
+// pick from the in-stock items /api/stocks/autocomplete/ suggests. The
+// chosen item's id goes in the hidden stock_item input next to the box.
+//
+//   <div class="stock-picker relative" data-url="{% url 'api_stock_autocomplete' %}">
+//     <input type="text" class="stock-picker-input" autocomplete="off" required>
+//     <input type="hidden" name="stock_item">
+//     <ul class="stock-picker-results hidden"></ul>
+//   </div>
+//
+// Pickers added to the page later (new order lines) work too.
+(function () {
+  const DELAY = 150;
+  const formatter = new Intl.NumberFormat();
+  const timers = new WeakMap();
+  const requests = new WeakMap();
+
+  function parts(element) {
+    const picker = element.closest('.stock-picker');
+    return {
+      picker: picker,
+      input: picker.querySelector('.stock-picker-input'),
+      value: picker.querySelector('input[type=hidden]'),
+      results: picker.querySelector('.stock-picker-results'),
+    };
+  }
+
+  function close(p) {
+    p.results.classList.add('hidden');
+    p.results.replaceChildren();
+  }
+
+  function choose(p, item) {
+    p.input.value = item.dataset.name;
+    p.value.value = item.dataset.id;
+    p.input.setCustomValidity('');
+    // Suggest the selling price on an empty price field of the same line
+    const line = p.picker.closest('.order-line') || p.picker.closest('form');
+    const price = line && line.querySelector('[name=sale_price]');
+    if (price && !price.value) {
+      price.value = item.dataset.price;
+      price.dispatchEvent(new Event('input', { bubbles: true }));
+    }
+    close(p);
+  }
+
+  function show(p, stocks) {
+    p.results.replaceChildren(...stocks.map(function (stock, i) {
+      const item = document.createElement('li');
+      item.className = 'px-3 py-2 cursor-pointer hover:bg-[#f3ceaf]' + (i === 0 ? ' bg-[#f3ceaf]' : '');
+      item.dataset.id = stock.id;
+      item.dataset.name = stock.name;
+      item.dataset.price = stock.selling_price;
+      const name = document.createElement('span');
+      name.className = 'font-medium';
+      name.textContent = stock.name;
+      const details = document.createElement('span');
+      details.className = 'block text-sm text-gray-500';
+      details.textContent = stock.category + ' · ' + stock.quantity + ' in stock · UGX ' +
+        formatter.format(Number(stock.selling_price));
+      item.append(name, details);
+      return item;
+    }));
+    if (!stocks.length) {
+      const empty = document.createElement('li');
+      empty.className = 'px-3 py-2 text-gray-500';
+      empty.textContent = 'No matching product in stock';
+      p.results.append(empty);
+    }
+    p.results.classList.remove('hidden');
+  }
+
+  function lookup(p) {
+    const query = p.input.value.trim();
+    if (requests.has(p.picker)) requests.get(p.picker).abort();
+    if (!query) {
+      close(p);
+      return;
+    }
+    const controller = new AbortController();
+    requests.set(p.picker, controller);
+    const url = p.picker.dataset.url + '?q=' + encodeURIComponent(query);
+    fetch(url, { signal: controller.signal, headers: { Accept: 'application/json' } })
+      .then(function (response) { return response.json(); })
+      .then(function (data) { show(p, data.results || []); })
+      .catch(function (error) {
+        if (error.name !== 'AbortError') close(p);
+      });
+  }
+
+  document.addEventListener('input', function (event) {
+    if (!event.target.matches('.stock-picker-input')) return;
+    const p = parts(event.target);
+    // Typing after a choice un-chooses it
+    p.value.value = '';
+    p.input.setCustomValidity('Choose a product from the list.');
+    clearTimeout(timers.get(p.picker));
+    timers.set(p.picker, setTimeout(function () { lookup(p); }, DELAY));
+  });
+
+  document.addEventListener('keydown', function (event) {
+    if (!event.target.matches('.stock-picker-input')) return;
+    const p = parts(event.target);
+    const items = Array.from(p.results.querySelectorAll('li[data-id]'));
+    const current = items.findIndex(function (item) { return item.classList.contains('bg-[#f3ceaf]'); });
+    if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+      if (!items.length) return;
+      event.preventDefault();
+      const step = event.key === 'ArrowDown' ? 1 : -1;
+      const next = (current + step + items.length) % items.length;
+      items.forEach(function (item, i) { item.classList.toggle('bg-[#f3ceaf]', i === next); });
+      items[next].scrollIntoView({ block: 'nearest' });
+    } else if (event.key === 'Enter' && current >= 0 && !p.results.classList.contains('hidden')) {
+      event.preventDefault();
+      choose(p, items[current]);
+    } else if (event.key === 'Escape') {
+      close(p);
+    }
+  });
+
+  // mousedown rather than click: it comes before the input loses focus
+  document.addEventListener('mousedown', function (event) {
+    const item = event.target.closest('.stock-picker-results li[data-id]');
+    if (item) {
+      event.preventDefault();
+      choose(parts(item), item);
+      return;
+    }
+    document.querySelectorAll('.stock-picker-results:not(.hidden)').forEach(function (results) {
+      if (!results.closest('.stock-picker').contains(event.target)) close(parts(results));
+    });
+  });
+})();
@@ -0,0 +1,20 @@
+"""
+Static file storage.
+
+collectstatic copies every static file to STATIC_ROOT under a name with
+a hash of its content (css/tailwind.min.css becomes
+css/tailwind.min.1a2b3c4d5e6f.css, url()s inside CSS are rewritten to
+match) and writes gzip and Brotli copies next to it. WhiteNoise serves
+the hashed names with a cache lifetime of ten years, so browsers fetch
+each version of a file once; a changed file gets a new name.
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Until collectstatic has written the manifest (tests, a fresh
+        # checkout) files are referred to by their own names
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -3,17 +3,49 @@ from django.shortcuts import render, redirect, get_object_or_404  # Rendering te
 from django.contrib.auth import authenticate, login, logout, get_user_model  # Authentication functions
 from django.contrib import messages  # Display messages to users
 from django.utils.dateparse import parse_date  # Convert string dates to date objects
-from .models import User, Stock, Sale  # Import custom models
-from decimal import Decimal  # Handle decimal numbers precisely (prices, totals)
+from .models import User, Stock, Sale, Order, SalesDailyRollup, StockCategoryTotal, StockForecast, StockMovement  # Import custom models
+from decimal import Decimal, InvalidOperation  # Handle decimal numbers precisely (prices, totals)
+from collections import Counter  # Tally quantities per stock item
 from django.utils.timezone import now  # Get current date/time in timezone-aware manner
 from datetime import date, timedelta  # Standard date/time manipulations
-from django.db.models import Sum  # Aggregate sums from querysets
+from django.db import transaction  # Keep related writes in one transaction
+from django.db.models import F, Q, Sum  # Aggregate sums from querysets
 from django.contrib.auth.decorators import login_required # Protect views requiring login
 from .forms import UserForm, UserAuthenticationForm  # Import forms for users
+from .search import search_sales, search_stocks, search_users  # Server-side list search
+from .pagination import CursorPaginator  # Keyset pagination for the large lists
+from .importers import import_stock, read_rows  # Bulk stock import from CSV/XLSX
+from .receipts import day_receipts, receipt_context, receipt_filename, receipt_lines, receipt_pdf  # Receipts and PDFs
+from .pdf import PDFUnavailable  # Raised when WeasyPrint cannot load
+from .exporters import AGENT_COLUMNS, SALES_COLUMNS, STOCK_COLUMNS, export_response, export_rows  # Streaming report export
+from .caching import cached, version  # Versioned cache keys, retired on every write
+from .asyncdb import concurrent_view, run_queries  # Opt-in parallel queries for the dashboard and reports
+from .conditional import conditional_page, table_state  # ETag / Last-Modified validators
+from .backends import LOGIN_FAILURE_WINDOW, login_throttled  # Failed-login throttle
+from . import analytics  # Columnar NumPy sales analytics
+from .reports import MAX_DAYS, agent_and_payment_report  # Agent leaderboard and payment method reports
 from django.core.paginator import Paginator  # Paginate querysets
+from django.utils.functional import SimpleLazyObject  # Defer page queries to an uncached fragment
+import io  # In-memory zip of receipt PDFs
 import json  # Handle JSON data
+import zipfile  # Bundle a day's receipts
+from django.http import Http404, HttpResponse, HttpResponseForbidden  # Raw (PDF/zip) responses
 from django.db.models.functions import TruncMonth  # For grouping by month in queries
-from django.views.decorators.cache import never_cache
+from django.views.decorators.cache import cache_control  # Short private browser cache
+
+# Stock categories offered on the stock and report forms
+STOCK_CATEGORIES = [
+    "Poles",
+    "Hardwood",
+    "Home Furniture",
+    "Office Furniture",
+    "Softwood",
+    "Timber",
+    "Garden Furniture",
+]
+
+# Items listed in the dashboard's reorder panel
+REORDER_PANEL_SIZE = 10
 
 # Get the custom User model for authentication
 User = get_user_model()
@@ -28,31 +60,26 @@ def homePage(request):
 def loginPage(request):
     """
     Handle user login.
-    - Authenticate by username or email.
-    - Display error if credentials are invalid.
+    - Authenticate by username or email (EmailOrUsernameModelBackend).
+    - Display error if credentials are invalid or too many attempts failed.
     """
     if request.method == "POST":
         # Get form inputs
         username_or_email = request.POST.get("identifier")
         password = request.POST.get("password")
 
-        # First, try authentication using username
         user = authenticate(request, username=username_or_email, password=password)
 
-        # If username login fails, try using email
-        if user is None:
-            try:
-                user_obj = User.objects.get(email=username_or_email)
-                user = authenticate(
-                    request, username=user_obj.username, password=password
-                )
-            except User.DoesNotExist:
-                user = None
-
         # If authentication succeeds, log user in
         if user is not None:
             login(request, user)
             return redirect("dashboardPage")
+        elif username_or_email and login_throttled(request, username_or_email):
+            messages.error(
+                request,
+                f"Too many failed attempts. Please try again in {LOGIN_FAILURE_WINDOW // 60} minutes.",
+            )
+            return redirect("loginPage")
         else:
             # Invalid credentials: show error and redirect to login
             messages.error(request, "Invalid credentials")
@@ -105,102 +132,148 @@ def registerPage(request):
 
 
 # Dashboard view
+@concurrent_view
 @login_required(login_url="/login/")  # redirect to login if not logged in
-@never_cache
+@cache_control(private=True, max_age=60)
 def dashboardPage(request):
     """
     Render the dashboard for the logged-in user.
     - Display metrics: total sales, daily sales, monthly sales, stock count.
     - Include charts for last 6 months sales and stock categories.
+    - List items due for reordering from the last demand forecast.
+    - Figures are cached until the next sale, stock write or forecast.
     """
     user = request.user
-
-    # Default metrics
-    total_sales = daily_sales = monthly_sales = total_stock = 0
-    latest_sales = Sale.objects.order_by("-date")[:10]
-
+    metrics = user.role in ["MANAGER", "SALES_AGENT"]
     today = date.today()
+    data = cached(
+        "dashboard", ("sale", "stock", "forecast"), lambda: dashboard_data(today, metrics), today, metrics
+    )
+    latest_sales = Sale.objects.with_related().order_by("-date", "-id")[:10]
 
-    if user.role in ["MANAGER", "SALES_AGENT"]:
-        total_sales = Sale.objects.count()
+    context = {"user": user, "latest_sales": latest_sales, **data}
+    return render(request, "dashboard.html", context)
 
-        # Daily sales sum
-        today_sales = Sale.objects.filter(date=today)
-        daily_sales = today_sales.aggregate(total=Sum("total_price"))["total"] or 0
 
-        # Monthly sales sum
-        monthly_sales = (
-            Sale.objects.filter(
-                date__year=today.year, date__month=today.month
-            ).aggregate(total=Sum("total_price"))["total"]
-            or 0
+def dashboard_data(today, metrics):
+    """
+    The dashboard's figures and chart series for `today`.
+    - Sale and stock metrics are left at 0 unless `metrics` is set.
+    - The independent queries go through run_queries().
+    """
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+    def rollup_totals():
+        # Sale count, daily and monthly sums in one pass over the rollup
+        return SalesDailyRollup.objects.aggregate(
+            count=Sum("sale_count"),
+            daily=Sum("total_price", filter=Q(day=today)),
+            monthly=Sum("total_price", filter=Q(day__gte=month_start, day__lt=next_month)),
         )
 
-        total_stock = Stock.objects.count()
-        latest_sales = Sale.objects.order_by("-date")[:10]
-
-    # Prepare monthly sales chart data (last 6 months)
-    last_6_months = Sale.objects.filter(
-        date__gte=date(today.year, today.month - 5 if today.month > 5 else 1, 1)
+    # Monthly sales chart data (last 6 months)
+    last_6_months = SalesDailyRollup.objects.filter(
+        day__gte=date(today.year, today.month - 5 if today.month > 5 else 1, 1)
     )
     monthly_data = (
-        last_6_months.annotate(month=TruncMonth("date"))
+        last_6_months.annotate(month=TruncMonth("day"))
         .values("month")
         .annotate(total=Sum("total_price"))
         .order_by("month")
     )
-    monthly_labels = [m["month"].strftime("%b %Y") for m in monthly_data]
-    monthly_sales_data = [float(m["total"] or 0) for m in monthly_data]
 
-    # Prepare pie chart for stock categories
+    # Pie chart for stock categories
     category_data = (
-        Stock.objects.values("category")
-        .annotate(total=Sum("quantity"))
+        StockCategoryTotal.objects.filter(quantity__gt=0)
+        .annotate(total=F("quantity"))
+        .values("category", "total")
         .order_by("-total")
     )
+
+    # Items at or below the reorder point the forecast_demand job set
+    reorder_needed = StockForecast.objects.reorder_needed().values(
+        "stock_id", "stock__name", "stock__quantity", "reorder_point", "cover", "suggested_order"
+    )[:REORDER_PANEL_SIZE]
+
+    queries = [lambda: list(monthly_data), lambda: list(category_data)]
+    if metrics:
+        queries += [rollup_totals, Stock.objects.count, lambda: list(reorder_needed)]
+    monthly_data, category_data, *figures = run_queries(*queries)
+
+    # Default metrics
+    total_sales = daily_sales = monthly_sales = total_stock = 0
+    reorder = []
+    if metrics:
+        totals, total_stock, reorder = figures
+        total_sales = totals["count"] or 0
+        daily_sales = totals["daily"] or 0
+        monthly_sales = totals["monthly"] or 0
+
+    monthly_labels = [m["month"].strftime("%b %Y") for m in monthly_data]
+    monthly_sales_data = [float(m["total"] or 0) for m in monthly_data]
     category_labels = [c["category"] for c in category_data]
     category_sales_data = [c["total"] for c in category_data]
 
-    context = {
-        "user": user,
+    return {
         "total_sales": total_sales,
         "daily_total": daily_sales,
         "monthly_sales": monthly_sales,
         "total_stock": total_stock,
-        "latest_sales": latest_sales,
+        "reorder": reorder,
         "monthly_labels": json.dumps(monthly_labels),
         "monthly_sales_data": json.dumps(monthly_sales_data),
         "category_labels": json.dumps(category_labels),
         "category_sales_data": json.dumps(category_sales_data),
     }
 
-    return render(request, "dashboard.html", context)
-
 
 # Sales page view
 @login_required(login_url="/login/")
+@conditional_page(lambda request: [version("sale", "stock", "user")])
 def salesPage(request):
     """
-    Display all sales with pagination (10 per page).
+    Display all sales, newest first, 10 per page.
+    - Filter by the `q` search term if given; it also matches agents.
+    - Pages are addressed by a `cursor` on (date, id) rather than a page number.
+    - The table is cached until the next sale, stock or user write.
+    - Answers 304 Not Modified while the sale, stock and user tables are unchanged.
     """
-    all_sales = Sale.objects.all().order_by("-date")
-    paginator = Paginator(all_sales, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    return render(request, "sales.html", {"page_obj": page_obj})
+    q = request.GET.get("q", "").strip()
+    cursor = request.GET.get("cursor")
+    all_sales = search_sales(Sale.objects.with_stock(), q)
+    paginator = CursorPaginator(all_sales, ("-date", "-id"), 10, approximate_count=True)
+    context = {
+        "page_obj": SimpleLazyObject(lambda: paginator.get_page(cursor)),
+        "q": q,
+        "cursor": cursor,
+        "version": version("sale", "stock", "user"),
+    }
+    return render(request, "sales.html", context)
 
 
 # Stocks page view
 @login_required(login_url="/login/")
+@conditional_page(lambda request: [version("stock")])
 def stocksPage(request):
     """
-    Display all stocks with pagination (10 per page).
+    Display all stocks by name, 10 per page.
+    - Filter by the `q` search term if given.
+    - Pages are addressed by a `cursor` on (name, id) rather than a page number.
+    - The table is cached until the next stock write.
+    - Answers 304 Not Modified while the stock table is unchanged.
     """
-    all_stocks = Stock.objects.all().order_by("name")
-    paginator = Paginator(all_stocks, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    return render(request, "stocks.html", {"page_obj": page_obj})
+    q = request.GET.get("q", "").strip()
+    cursor = request.GET.get("cursor")
+    all_stocks = search_stocks(Stock.objects.all(), q)
+    paginator = CursorPaginator(all_stocks, ("name", "id"), 10, approximate_count=True)
+    context = {
+        "page_obj": SimpleLazyObject(lambda: paginator.get_page(cursor)),
+        "q": q,
+        "cursor": cursor,
+        "version": version("stock"),
+    }
+    return render(request, "stocks.html", context)
 
 
 # Record new sale view
@@ -210,14 +283,13 @@ def recordSales(request):
     Handle creation of a new sale.
     - Validates stock before saving.
     - Displays errors on the same page (no double messages).
+    - The product is chosen with the stock picker (api.stock_autocomplete).
     """
-    all_stocks = Stock.objects.all()
-
     if request.method == "POST":
         stock_id = request.POST.get("stock_item")
         if not stock_id:
             messages.error(request, "Please select a product.")
-            return render(request, "record_sales.html", {"all_stocks": all_stocks})
+            return render(request, "record_sales.html")
 
         stock_item = get_object_or_404(Stock, id=stock_id)
         quantity_sold = int(request.POST.get("quantity_sold", 0))
@@ -225,63 +297,274 @@ def recordSales(request):
         customer_name = request.POST.get("customer_name")
         payment_method = request.POST.get("payment_method")
 
-        # Validate stock
-        if quantity_sold > stock_item.quantity:
-            messages.error(
-                request,
-                f"Not enough stock available for {stock_item.name}. "
-                f"Available: {stock_item.quantity}, requested: {quantity_sold}.",
-            )
-            # Render the same form again instead of redirecting
-            return render(request, "record_sales.html", {"all_stocks": all_stocks})
+        if quantity_sold < 1:
+            messages.error(request, "Quantity sold must be at least 1.")
+            return render(request, "record_sales.html")
 
-        # Deduct from stock and save
-        stock_item.quantity -= quantity_sold
-        stock_item.save()
-
-        # Create the sale record
-        Sale.objects.create(
-            stock_item=stock_item,
-            quantity_sold=quantity_sold,
+        # Deduct as one conditional UPDATE so concurrent sales can never take
+        # the same stock item below zero, then create the sale record, its
+        # dashboard rollup figures and its ledger movement
+        sale = Sale.objects.sell(
+            stock_item,
+            quantity_sold,
             sale_price=sale_price,
             customer_name=customer_name,
             payment_method=payment_method,
             sales_agent=request.user,
         )
+        if sale is None:
+            stock_item.refresh_from_db(fields=["quantity"])
+            messages.error(
+                request,
+                f"Not enough stock available for {stock_item.name}. "
+                f"Available: {stock_item.quantity}, requested: {quantity_sold}.",
+            )
+            # Render the same form again instead of redirecting
+            return render(request, "record_sales.html")
 
+        stock_item.refresh_from_db(fields=["quantity"])
         messages.success(
             request,
             f"Sale recorded successfully! Remaining stock: {stock_item.quantity}",
         )
         return redirect("salesPage")
 
-    return render(request, "record_sales.html", {"all_stocks": all_stocks})
+    return render(request, "record_sales.html")
+
+
+# Record multi-line order view
+@login_required(login_url="/login/")
+def recordOrder(request):
+    """
+    Record one order (customer, payment method) with several line items.
+    - Validates every line before writing anything.
+    - Reserves all quantities with one UPDATE and inserts the lines with
+      bulk_create, in one transaction.
+    - Redirects to the combined receipt.
+    """
+    if request.method == "POST":
+        customer_name = request.POST.get("customer_name")
+        payment_method = request.POST.get("payment_method")
+        rows = zip(
+            request.POST.getlist("stock_item"),
+            request.POST.getlist("quantity_sold"),
+            request.POST.getlist("sale_price"),
+        )
+
+        # Parse and validate all lines first
+        lines = []
+        try:
+            for stock_id, quantity, price in rows:
+                if not stock_id:
+                    continue
+                lines.append((int(stock_id), int(quantity), Decimal(price)))
+        except (ValueError, InvalidOperation):
+            messages.error(request, "Every line needs a product, a whole quantity and a price.")
+            return render(request, "record_order.html")
+
+        stocks = Stock.objects.in_bulk([stock_id for stock_id, _, _ in lines])
+        error = None
+        if not lines:
+            error = "Please add at least one product."
+        elif not customer_name:
+            error = "Customer name is required."
+        elif any(stock_id not in stocks for stock_id, _, _ in lines):
+            error = "One of the selected products no longer exists."
+        elif any(quantity < 1 or price < 0 for _, quantity, price in lines):
+            error = "Quantities must be at least 1 and prices cannot be negative."
+        if error:
+            messages.error(request, error)
+            return render(request, "record_order.html")
+
+        needed = Counter()
+        for stock_id, quantity, _ in lines:
+            needed[stock_id] += quantity
+
+        with transaction.atomic():
+            # Reserve every line's stock at once; nothing is taken if any is short
+            if not Stock.objects.deduct_many(needed):
+                short = Stock.objects.filter(pk__in=list(needed)).only("name", "quantity")
+                for stock in short:
+                    if stock.quantity < needed[stock.id]:
+                        messages.error(
+                            request,
+                            f"Not enough stock available for {stock.name}. "
+                            f"Available: {stock.quantity}, requested: {needed[stock.id]}.",
+                        )
+                return render(request, "record_order.html")
+
+            order = Order.objects.create(
+                customer_name=customer_name,
+                payment_method=payment_method,
+                sales_agent=request.user,
+            )
+            sales = []
+            for stock_id, quantity, price in lines:
+                sale = Sale(
+                    order=order,
+                    stock_item=stocks[stock_id],
+                    quantity_sold=quantity,
+                    sale_price=price,
+                    customer_name=customer_name,
+                    payment_method=payment_method,
+                    sales_agent=request.user,
+                    date=order.date,
+                )
+                sale.fill_prices()  # bulk_create skips Sale.save()
+                sales.append(sale)
+            Sale.objects.bulk_create(sales)
+            SalesDailyRollup.objects.add_sales(sales)
+            StockMovement.objects.record_many(
+                StockMovement(stock=sale.stock_item, kind="SALE", quantity=-sale.quantity_sold, sale=sale)
+                for sale in sales
+            )
+
+        messages.success(request, f"Order recorded with {len(sales)} items.")
+        return redirect("print_receipt", sale_id=sales[0].id)
+
+    return render(request, "record_order.html")
 
 
 # Sales report view
+@concurrent_view
 @login_required(login_url="/login/")
+@conditional_page(lambda request: [version("sale", "stock"), now().date()])
 def sales_report(request):
     """
     Display daily and monthly sales reports.
+    - The page of sales, its count and both totals go through run_queries().
+    - Answers 304 Not Modified while the sale and stock tables are unchanged.
     """
-    all_sales = Sale.objects.all().order_by("-date")
-    paginator = Paginator(all_sales, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    all_sales = Sale.objects.with_stock()
+    paginator = CursorPaginator(all_sales, ("-date", "-id"), 10, approximate_count=True)
+    cursor = request.GET.get("cursor")
 
     today = now().date()
     sales_today = Sale.objects.filter(date=today)
-    monthly_sales = Sale.objects.filter(date__month=today.month, date__year=today.year)
+    monthly_sales = Sale.objects.in_month(today)
+
+    page_obj, _, daily_total, monthly_total = run_queries(
+        lambda: paginator.get_page(cursor),
+        lambda: paginator.count,  # cached on the paginator for the template
+        sales_today.total_amount,
+        monthly_sales.total_amount,
+    )
 
     context = {
-        "daily_total": sum(s.amount for s in sales_today),
-        "monthly_total": sum(s.amount for s in monthly_sales),
+        "daily_total": daily_total,
+        "monthly_total": monthly_total,
         "page_obj": page_obj,
         "all_sales": all_sales,
+        "categories": STOCK_CATEGORIES,
     }
     return render(request, "salesreport.html", context)
 
 
+# Agents report view (managers)
+@concurrent_view
+@login_required(login_url="/login/")
+def agents_report(request):
+    """
+    Sales agent leaderboard and payment method report for a date range.
+    - Revenue, units, sales and average ticket per agent and per payment method.
+    - Daily revenue for the top agents (or the `agent` chosen) and per payment method.
+    - The date range is cut to the last MAX_DAYS days of it.
+    - Read from the daily rollups and cached until the next sale or user write.
+    - `format=csv|xlsx` downloads the leaderboard.
+    """
+    user = request.user
+    if user.role != "MANAGER":
+        return HttpResponseForbidden("Managers only.")
+    start, end, _ = export_filters(request)
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        start, end = end, start
+    # Every day of the range is a point on each trend line
+    start = max(start, end - timedelta(days=MAX_DAYS - 1))
+    try:
+        agent = int(request.GET.get("agent", ""))
+    except ValueError:
+        agent = None
+
+    data = cached(
+        "agents-report", ("sale", "user"),
+        lambda: agent_and_payment_report(start, end, agent), start, end, agent,
+    )
+    if request.GET.get("format"):
+        rows = (tuple(row[key] for _, key in AGENT_COLUMNS) for row in data["agents"])
+        return export_response(
+            rows, AGENT_COLUMNS, f"agents-{start}-{end}", request.GET.get("format"), "Agents"
+        )
+
+    context = {"user": user, "start": start, "end": end, "agent": agent, **data}
+    return render(request, "agentsreport.html", context)
+
+
+# Analytics windows offered on the page, in days (0 for all sales)
+ANALYTICS_WINDOWS = {30: "30 days", 90: "90 days", 365: "12 months", 0: "All time"}
+
+
+# Sales analytics view (managers)
+@login_required(login_url="/login/")
+def analyticsPage(request):
+    """
+    Sales trends and profit for managers.
+    - Revenue and margin per product, category and agent over the `days` window.
+    - Daily revenue with moving averages, and twelve months against the year before.
+    - Computed in NumPy from every sale, cached until the next sale, stock or user write.
+    """
+    if request.user.role != "MANAGER":
+        return HttpResponseForbidden("Managers only.")
+    try:
+        days = int(request.GET.get("days", 90))
+    except ValueError:
+        days = 90
+    if days not in ANALYTICS_WINDOWS:
+        days = 90
+
+    context = {
+        "report": analytics.cached_report(days),
+        "days": days,
+        "windows": ANALYTICS_WINDOWS,
+    }
+    return render(request, "analytics.html", context)
+
+
+def export_filters(request):
+    """Read the `start`, `end` and `category` export filters from the query string."""
+    dates = []
+    for name in ("start", "end"):
+        try:
+            dates.append(parse_date(request.GET.get(name, "")))
+        except ValueError:
+            dates.append(None)
+    return dates[0], dates[1], request.GET.get("category", "").strip()
+
+
+# Export sales view
+@login_required(login_url="/login/")
+def export_sales(request):
+    """
+    Stream the sales report as a CSV or XLSX download.
+    - Filter by sale date range and stock category if given.
+    - Rows are fetched and written in chunks, oldest first.
+    """
+    start, end, category = export_filters(request)
+    sales = Sale.objects.all()
+    if start:
+        sales = sales.filter(date__gte=start)
+    if end:
+        sales = sales.filter(date__lte=end)
+    if category:
+        sales = sales.filter(stock_item__category=category)
+
+    rows = export_rows(sales, SALES_COLUMNS, ("date", "id"))
+    return export_response(
+        rows, SALES_COLUMNS, f"sales-{now().date()}", request.GET.get("format"), "Sales"
+    )
+
+
 # Record new stock view
 @login_required(login_url="/login/")
 def recordStocks(request):
@@ -291,15 +574,7 @@ def recordStocks(request):
     - Save stock and redirect to stocks page.
     """
     today = now().date()
-    categories = [
-        "Poles",
-        "Hardwood",
-        "Home Furniture",
-        "Office Furniture",
-        "Softwood",
-        "Timber",
-        "Garden Furniture",
-    ]
+    categories = STOCK_CATEGORIES
 
     if request.method == "POST":
         # Get all fields from form
@@ -390,39 +665,115 @@ def recordStocks(request):
             supplier=supplier,
             date_added=date_added,
         )
-        stock.save()
+        with transaction.atomic():
+            stock.save()
+            StockMovement.objects.record(stock, "RECEIPT", int(stock.quantity))
         messages.success(request, f"Stock '{name}' added successfully!")
         return redirect("stocksPage")
 
     return render(request, "record_stocks.html", {"categories": categories})
 
 
+# Bulk stock import view
+@login_required(login_url="/login/")
+def importStocks(request):
+    """
+    Import stock items from an uploaded CSV or XLSX file.
+    - Validate every row with the StockForm rules.
+    - Add quantities to items already in stock (same name, type, color, supplier).
+    - Show a summary and the first rejected rows.
+    """
+    context = {}
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if not upload:
+            messages.error(request, "Please choose a CSV or XLSX file.")
+            return render(request, "import_stocks.html", context)
+        try:
+            result = import_stock(read_rows(upload.file, upload.name))
+        except ValueError as exc:
+            messages.error(request, str(exc))
+            return render(request, "import_stocks.html", context)
+
+        messages.success(
+            request,
+            f"Imported {result.created + result.updated} rows: {result.created} new items, "
+            f"{result.updated} restocked, {result.failed} rejected.",
+        )
+        context = {"result": result, "errors": result.errors[:50]}
+    return render(request, "import_stocks.html", context)
+
+
 # Stocks report view
+@concurrent_view
 @login_required(login_url="loginPage")
+@conditional_page(lambda request: [version("stock")])
 def stocks_report(request):
     """
     Display all stock items with pagination.
+    - Filter by the `q` search term if given.
     - Calculate total stock value.
+    - The table and total are cached until the next stock write.
+    - Answers 304 Not Modified while the stock table is unchanged.
     """
-    all_stocks = Stock.objects.all().order_by("name")
+    q = request.GET.get("q", "").strip()
+    all_stocks = search_stocks(Stock.objects.all(), q).order_by("name", "id")
     paginator = Paginator(all_stocks, 10)
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = SimpleLazyObject(lambda: paginator.get_page(page_number))
 
-    total_value = sum(stock.selling_price * stock.quantity for stock in all_stocks)
+    total_value = cached("stock-value", ("stock",), StockCategoryTotal.objects.valuation)
 
-    context = {"page_obj": page_obj, "total_value": total_value}
+    context = {
+        "page_obj": page_obj,
+        "total_value": total_value,
+        "q": q,
+        "page": page_number,
+        "version": version("stock"),
+        "categories": STOCK_CATEGORIES,
+    }
+    # The page is only queried, in the template, if its fragment is not cached
     return render(request, "stocksreport.html", context)
 
 
+# Export stock view
+@login_required(login_url="/login/")
+def export_stocks(request):
+    """
+    Stream the stock report as a CSV or XLSX download.
+    - Filter by date added and category if given.
+    """
+    start, end, category = export_filters(request)
+    stocks = Stock.objects.all()
+    if start:
+        stocks = stocks.filter(date_added__gte=start)
+    if end:
+        stocks = stocks.filter(date_added__lte=end)
+    if category:
+        stocks = stocks.filter(category=category)
+
+    rows = export_rows(stocks, STOCK_COLUMNS, ("name", "id"))
+    return export_response(
+        rows, STOCK_COLUMNS, f"stock-{now().date()}", request.GET.get("format"), "Stock"
+    )
+
+
 # View specific sale
 @login_required(login_url="/login/")
+@conditional_page(
+    lambda request, sale_id: [
+        *table_state(Sale.objects.filter(pk=sale_id), Stock.objects.filter(sales=sale_id)),
+        version("user"),  # the agent's name
+        request.headers.get("x-requested-with"),  # modal or full page
+    ]
+)
 def viewSales(request, sale_id):
     """
     Show details of a single sale.
     - Supports modal AJAX view if requested.
+    - Answers 304 Not Modified while the sale is unchanged.
     """
-    sale = Sale.objects.get(id=sale_id)
+    sale = Sale.objects.with_related().get(id=sale_id)
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return render(request, "view_sales_modal.html", {"sale": sale})
     return render(request, "viewsales.html", {"sale": sale})
@@ -430,12 +781,20 @@ def viewSales(request, sale_id):
 
 # View specific stock
 @login_required(login_url="/login/")
+@conditional_page(lambda request, stock_id: table_state(Stock.objects.filter(pk=stock_id)))
 def viewStocks(request, stock_id):
     """
     Show details of a single stock item.
+    - List its latest stock movements with the running balance.
+    - Both are cached until the next stock write.
+    - Answers 304 Not Modified while the item is unchanged.
     """
-    stock = Stock.objects.get(id=stock_id)
-    return render(request, "viewstocks.html", {"stock": stock})
+    def load():
+        stock = Stock.objects.get(id=stock_id)
+        return stock, list(stock.movements.order_by("-created_at", "-id")[:10])
+
+    stock, movements = cached("stock-detail", ("stock",), load, stock_id)
+    return render(request, "viewstocks.html", {"stock": stock, "movements": movements})
 
 
 # Edit existing sale
@@ -444,30 +803,65 @@ def editSales(request, sale_id):
     """
     Edit a sale record.
     - Update stock, quantity, price, transport, and recalculate totals.
+    - Put the old quantity back on its stock item and take the new one off,
+      refusing the edit if there is not enough stock.
     """
-    sale = Sale.objects.get(id=sale_id)
-    all_stocks = Stock.objects.all()
+    sale = Sale.objects.select_related("stock_item").get(id=sale_id)
 
     if request.method == "POST":
         stock_id = request.POST.get("stock_item")
-        sale.stock_item = get_object_or_404(Stock, id=stock_id)
-        sale.quantity_sold = int(request.POST.get("quantity_sold", 0))
-        sale.sale_price = Decimal(request.POST.get("sale_price", "0"))
-        sale.customer_name = request.POST.get("customer_name")
-        sale.payment_method = request.POST.get("payment_method")
-        sale.transport = request.POST.get("transport", "no")
-
-        # Calculate transport cost
-        if sale.transport.lower() == "yes":
-            sale.transport = sale.sale_price * Decimal("0.05")
-        else:
-            sale.transport = Decimal("0")
+        stock_item = get_object_or_404(Stock, id=stock_id)
+        quantity_sold = int(request.POST.get("quantity_sold", 0))
+        if quantity_sold < 1:
+            messages.error(request, "Quantity sold must be at least 1.")
+            return render(request, "editsales.html", {"sale": sale})
+
+        with transaction.atomic():
+            # Take the old figures out of the rollup before changing the sale
+            SalesDailyRollup.objects.add_sale(sale, sign=-1)
+            Stock.objects.restore(sale.stock_item_id, sale.quantity_sold)
+            reversal = StockMovement(
+                stock=sale.stock_item, kind="REVERSAL", quantity=sale.quantity_sold, sale=sale
+            )
 
-        sale.sales_agent = request.user
-        sale.save()
+            enough = Stock.objects.deduct(stock_item.id, quantity_sold)
+            if enough:
+                sale.stock_item = stock_item
+                sale.quantity_sold = quantity_sold
+                sale.sale_price = Decimal(request.POST.get("sale_price", "0"))
+                sale.customer_name = request.POST.get("customer_name")
+                sale.payment_method = request.POST.get("payment_method")
+                sale.transport = request.POST.get("transport", "no")
+
+                # Calculate transport cost
+                if sale.transport.lower() == "yes":
+                    sale.transport = sale.sale_price * Decimal("0.05")
+                else:
+                    sale.transport = Decimal("0")
+
+                sale.sales_agent = request.user
+                sale.save()
+                SalesDailyRollup.objects.add_sale(sale)
+                StockMovement.objects.record_many([
+                    reversal,
+                    StockMovement(stock=stock_item, kind="SALE", quantity=-quantity_sold, sale=sale),
+                ])
+            else:
+                # Available includes this sale's own units, put back above;
+                # then undo everything in this block
+                stock_item.refresh_from_db(fields=["quantity"])
+                transaction.set_rollback(True)
+
+        if not enough:
+            messages.error(
+                request,
+                f"Not enough stock available for {stock_item.name}. "
+                f"Available: {stock_item.quantity}, requested: {quantity_sold}.",
+            )
+            return render(request, "editsales.html", {"sale": sale})
         return redirect("salesPage")
 
-    return render(request, "editsales.html", {"sale": sale, "all_stocks": all_stocks})
+    return render(request, "editsales.html", {"sale": sale})
 
 
 # Edit stock item
@@ -475,18 +869,34 @@ def editSales(request, sale_id):
 def editStocks(request, stock_id):
     """
     Edit a stock record.
+    - Quantity, price and category changes are recorded in the stock ledger.
+    - A category change moves the item's sales in the daily rollup.
     """
     stock = Stock.objects.get(id=stock_id)
     if request.method == "POST":
-        stock.name = request.POST.get("name")
-        stock.type = request.POST.get("type")
-        stock.quantity = request.POST.get("quantity")
-        stock.category = request.POST.get("category")
-        stock.color = request.POST.get("color")
-        stock.cost_price = request.POST.get("cost_price")
-        stock.selling_price = request.POST.get("selling_price")
-        stock.supplier = request.POST.get("supplier")
-        stock.save()
+        try:
+            quantity = int(request.POST.get("quantity"))
+            selling_price = Decimal(request.POST.get("selling_price"))
+        except (TypeError, ValueError, InvalidOperation):
+            messages.error(request, "Quantity and selling price must be numbers.")
+            return render(request, "editstocks.html", {"stock": stock})
+
+        with transaction.atomic():
+            # Lock the row and take the figures the ledger last saw
+            stock = Stock.objects.select_for_update().get(id=stock_id)
+            old = (stock.quantity, stock.selling_price, stock.category)
+            stock.name = request.POST.get("name")
+            stock.type = request.POST.get("type")
+            stock.quantity = quantity
+            stock.category = request.POST.get("category")
+            stock.color = request.POST.get("color")
+            stock.cost_price = request.POST.get("cost_price")
+            stock.selling_price = selling_price
+            stock.supplier = request.POST.get("supplier")
+            stock.save()
+            StockMovement.objects.record_many(StockMovement.objects.changes(stock, *old))
+            if stock.category != old[2]:
+                SalesDailyRollup.objects.move_categories({stock.pk: old[2]})
         return redirect("stocksPage")
     return render(request, "editstocks.html", {"stock": stock})
 
@@ -496,10 +906,15 @@ def editStocks(request, stock_id):
 def deleteSales(request, sale_id):
     """
     Delete a sale record after confirmation.
+    - The quantity sold goes back into stock.
     """
-    sale = Sale.objects.get(id=sale_id)
+    sale = Sale.objects.select_related("stock_item").get(id=sale_id)
     if request.method == "POST":
-        sale.delete()
+        with transaction.atomic():
+            SalesDailyRollup.objects.add_sale(sale, sign=-1)
+            Stock.objects.restore(sale.stock_item_id, sale.quantity_sold)
+            StockMovement.objects.record(sale.stock_item, "DELETION", sale.quantity_sold, sale=sale)
+            sale.delete()
         return redirect("salesPage")
     return render(request, "deletesale.html", {"sale": sale})
 
@@ -509,10 +924,19 @@ def deleteSales(request, sale_id):
 def deleteStocks(request, stock_id):
     """
     Delete a stock record after confirmation.
+    - The remaining quantity is written off in the stock ledger.
     """
-    stock = Stock.objects.get(id=stock_id)
+    stock = get_object_or_404(Stock, id=stock_id)
     if request.method == "POST":
-        stock.delete()
+        with transaction.atomic():
+            # Lock the row so no sale or restock lands between reading the
+            # quantity written off and deleting the item
+            stock = get_object_or_404(Stock.objects.select_for_update(), id=stock_id)
+            # The stock's sales are cascade-deleted with it
+            SalesDailyRollup.objects.remove_sales(stock.sales.all())
+            Stock.objects.filter(pk=stock.pk).update(quantity=0)
+            StockMovement.objects.record(stock, "WRITE_OFF", -stock.quantity)
+            stock.delete()
         return redirect("stocksPage")
     return render(request, "deletestock.html", {"stock": stock})
 
@@ -521,10 +945,23 @@ def deleteStocks(request, stock_id):
 @login_required(login_url="/login/")
 def usersPage(request):
     """
-    Display all registered users.
+    Display all registered users with pagination (10 per page).
+    - Filter by the `q` search term if given.
+    - The table is cached until the next user write.
     """
-    users = User.objects.all()
-    return render(request, "users.html", {"users": users})
+    q = request.GET.get("q", "").strip()
+    users = search_users(User.objects.all(), q).order_by("first_name", "last_name", "id")
+    paginator = Paginator(users, 10)
+    page_number = request.GET.get("page")
+    page_obj = SimpleLazyObject(lambda: paginator.get_page(page_number))
+    context = {
+        "users": page_obj,
+        "page_obj": page_obj,
+        "q": q,
+        "page": page_number,
+        "version": version("user"),
+    }
+    return render(request, "users.html", context)
 
 
 # Edit user
@@ -563,7 +1000,10 @@ def deleteUser(request, user_id):
     """
     user = User.objects.get(id=user_id)
     if request.method == "POST":
-        user.delete()
+        with transaction.atomic():
+            # The user's sales are cascade-deleted with them
+            SalesDailyRollup.objects.remove_sales(Sale.objects.filter(sales_agent=user))
+            user.delete()
         return redirect("usersPage")
     return render(request, "deleteuser.html", {"user": user})
 
@@ -573,20 +1013,59 @@ def deleteUser(request, user_id):
 def print_receipt(request, sale_id):
     """
     Prepare sale receipt data for printing.
+    - A sale that is part of an order prints every line of that order.
     """
-    sale = get_object_or_404(Sale, id=sale_id)
-    unit_price = sale.sale_price / sale.quantity_sold  # Calculate unit price
-    line_total = sale.quantity_sold * unit_price
-    total_paid = line_total + (sale.transport or Decimal("0"))
-
-    context = {
-        "sale": sale,
-        "unit_price": unit_price,
-        "total_paid": total_paid,
-    }
+    sale = get_object_or_404(Sale.objects.with_related(), id=sale_id)
+    context = receipt_context(receipt_lines(sale))
     return render(request, "receipt.html", context)
 
 
+# Receipt PDF for a sale
+@login_required(login_url="/login/")
+def print_receipt_pdf(request, sale_id):
+    """
+    Render the sale's receipt as a PDF on the server.
+    - Unchanged receipts are served from the cache.
+    """
+    sale = get_object_or_404(Sale.objects.with_related(), id=sale_id)
+    lines = receipt_lines(sale)
+    try:
+        pdf = receipt_pdf(lines)
+    except PDFUnavailable as exc:
+        return HttpResponse(str(exc), status=503, content_type="text/plain")
+
+    response = HttpResponse(pdf, content_type="application/pdf")
+    response["Content-Disposition"] = f'inline; filename="{receipt_filename(lines)}"'
+    return response
+
+
+# All receipts for a day
+@login_required(login_url="/login/")
+def print_day_receipts(request, day):
+    """
+    Download every receipt of a day as a zip of PDFs.
+    - Receipts not yet cached are rendered in a process pool.
+    """
+    try:
+        receipt_day = parse_date(day)
+    except ValueError:
+        receipt_day = None
+    if receipt_day is None:
+        raise Http404("Invalid date")
+    try:
+        receipts = day_receipts(receipt_day)
+    except PDFUnavailable as exc:
+        return HttpResponse(str(exc), status=503, content_type="text/plain")
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for filename, pdf in receipts:
+            zf.writestr(filename, pdf)
+    response = HttpResponse(archive.getvalue(), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="receipts-{receipt_day}.zip"'
+    return response
+
+
 # Logout page
 @login_required(login_url="/login/")
 def logoutPage(request):
@@ -2,6 +2,9 @@
 ASGI config for mwfproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+With DJANGO_CONCURRENT_QUERIES=1 the dashboard and reports are async
+views; serve them with e.g.
+``DJANGO_CONN_MAX_AGE=0 uvicorn mwfproject.asgi:application --workers 4``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
+from .database import cache_key_prefix, database_from_url, sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +55,44 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request profiling (mwfapp/profiling.py): per-view timings and SQL counts
+# in a Server-Timing header, slow requests logged to PROFILING_SLOW_LOG as
+# JSON lines, and totals at /metrics
+PROFILING = os.environ.get('DJANGO_PROFILING') == '1'
+if PROFILING:
+    MIDDLEWARE.insert(0, 'mwfapp.middleware.ProfilingMiddleware')
+PROFILING_SLOW_MS = int(os.environ.get('DJANGO_PROFILING_SLOW_MS', 500))
+PROFILING_SLOW_LOG = os.environ.get(
+    'DJANGO_PROFILING_SLOW_LOG', os.path.join(tempfile.gettempdir(), 'mwfproject-slow-requests.jsonl')
+)
+# Lets a Prometheus scraper read /metrics with "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN', '')
+
+# Run the dashboard's and reports' independent queries in parallel threads
+# and serve those pages as async views (mwfapp/asyncdb.py). Off by default:
+# on one CPU with SQLite it was slower; turn it on only where load_test
+# shows a gain (multi-core hosts, PostgreSQL, ASGI)
+CONCURRENT_QUERIES = os.environ.get('DJANGO_CONCURRENT_QUERIES') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {'message': {'format': '%(message)s'}},
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': PROFILING_SLOW_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'mwfapp.slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'mwfproject.urls'
 
 TEMPLATES = [
@@ -75,12 +116,53 @@ WSGI_APPLICATION = 'mwfproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# SQLite performance profile, run on every new connection. WAL lets
+# readers carry on while a sale is being written, and with WAL
+# synchronous=NORMAL only syncs at checkpoints. DJANGO_SQLITE_PROFILE=off
+# leaves SQLite's defaults (rollback journal, full sync) in place.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': int(os.environ.get('DJANGO_SQLITE_BUSY_TIMEOUT', 20_000)),  # ms
+    'mmap_size': int(os.environ.get('DJANGO_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('DJANGO_SQLITE_CACHE_KB', 64 * 1024)),  # negative: KiB
+    'temp_store': 'memory',
+}
+if os.environ.get('DJANGO_SQLITE_PROFILE', 'tuned') == 'off':
+    SQLITE_PRAGMAS = {}
+
+# DATABASE_URL selects another database; see mwfproject/database.py
+if os.environ.get('DATABASE_URL'):
+    DATABASES = {
+        'default': database_from_url(
+            os.environ['DATABASE_URL'],
+            SQLITE_PRAGMAS,
+            pool=os.environ.get('DATABASE_POOL', 'psycopg'),
+            pool_size=int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+        )
+    }
+else:
+    DATABASES = {'default': sqlite_database(BASE_DIR / 'db.sqlite3', SQLITE_PRAGMAS)}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# File-based so every worker process sees the same entries and the same
+# invalidations (see mwfapp/caching.py). Keys are prefixed per database;
+# the tests run on an in-memory cache instead (mwfproject/testing.py)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'DJANGO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mwfproject-cache')
+        ),
+        'KEY_PREFIX': cache_key_prefix(DATABASES['default']),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
     }
 }
+TEST_RUNNER = 'mwfproject.testing.TestRunner'
 
 
 # Password validation
@@ -120,6 +202,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+# collectstatic gives static files content-hashed names, which WhiteNoise
+# serves with far-future cache headers, and gzip and Brotli copies
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'mwfapp.storage.StaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -129,9 +217,11 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'  # or wherever you want to redirect after login
 LOGOUT_REDIRECT_URL = '/login/'
 AUTH_USER_MODEL = "mwfapp.User"
+# Looks users up by username or email itself, so no ModelBackend fallback
+# (it would repeat the lookup and the password hash on every failure)
 AUTHENTICATION_BACKENDS = [
     'mwfapp.backends.EmailOrUsernameModelBackend',
-    'django.contrib.auth.backends.ModelBackend',  # fallback
 ]
-# Static file storage for production
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Proxies in front of the app that append to X-Forwarded-For; the login
+# throttle counts failures per client address seen by the last of them
+TRUSTED_PROXIES = int(os.environ.get('DJANGO_TRUSTED_PROXIES', 0))
@@ -2,7 +2,7 @@ from django.urls import path
 from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
-from mwfapp import views
+from mwfapp import api, profiling, views
 
 urlpatterns = [
     # home & admin
@@ -12,11 +12,13 @@ urlpatterns = [
     path("register/", views.registerPage, name="registerPage"),
     path("dashboard/", views.dashboardPage, name="dashboardPage"),
     path("recordsales/", views.recordSales, name="recordSales"),
+    path("recordorder/", views.recordOrder, name="recordOrder"),
     path("sales/", views.salesPage, name="salesPage"),
     path("viewsales/<str:sale_id>/", views.viewSales, name="viewSales"),
     path("editsales/<str:sale_id>/", views.editSales, name="editSales"),
     path("deletesales/<str:sale_id>/", views.deleteSales, name="deleteSales"),
     path("recordstocks/", views.recordStocks, name="recordStocks"),
+    path("importstocks/", views.importStocks, name="importStocks"),
     path("stocks/", views.stocksPage, name="stocksPage"),
     path("viewstocks/<str:stock_id>/", views.viewStocks, name="viewStocks"),
     path("editstocks/<str:stock_id>/", views.editStocks, name="editStocks"),
@@ -29,7 +31,21 @@ urlpatterns = [
     path("logout/", views.logoutPage, name="logoutPage"),
     path("salesreport", views.sales_report, name="sales_report"),
     path("stocksreport", views.stocks_report, name="stocks_report"),
+    path("analytics/", views.analyticsPage, name="analyticsPage"),
+    path("agentsreport", views.agents_report, name="agents_report"),
+    path("salesreport/export", views.export_sales, name="export_sales"),
+    path("stocksreport/export", views.export_stocks, name="export_stocks"),
     path("print_receipt/<int:sale_id>/", views.print_receipt, name="print_receipt"),
+    path("print_receipt/<int:sale_id>/pdf", views.print_receipt_pdf, name="print_receipt_pdf"),
+    path("print_receipts/<str:day>/", views.print_day_receipts, name="print_day_receipts"),
+    # JSON API
+    path("api/stocks/", api.stocks, name="api_stocks"),
+    path("api/stocks/<int:stock_id>/", api.stock_detail, name="api_stock_detail"),
+    path("api/stocks/autocomplete/", api.stock_autocomplete, name="api_stock_autocomplete"),
+    path("api/stock-levels/", api.stock_levels, name="api_stock_levels"),
+    path("api/sales/", api.sales, name="api_sales"),
+    # Request totals for Prometheus (mwfapp/profiling.py)
+    path("metrics", profiling.metrics, name="metrics"),
 ]
 
 # Serve static files during production (when DEBUG=False)